@@ -10,12 +10,14 @@ from grass.pygrass.gis import *
 import grass.script as grass
 import grass.script.setup as gsetup
 import re
+from grass_import import import_folder
+from temporal import MONTHLY_SERIES, register_series
 
 
 
 
 # Main function
-def main(gisdb, location, mapset): 
+def main(gisdb, location, mapset, link=True, workers=None): 
 
     os.environ['GISDBASE'] = gisdb
     os.environ['LOCATION_NAME'] = location
@@ -35,12 +37,15 @@ def main(gisdb, location, mapset):
 
    
     input_folder = "/Volumes/ExternalSSD/eqipa_data/pcp_imd_monthly"
-    for file in os.listdir(input_folder):
-        if file.endswith(".tif"):
-            full_path = os.path.join(input_folder, file)
-            name = os.path.splitext(file)[0]  
-            print(f"Importing {file} as {name}")
-            gs.run_command('r.import', input=full_path, output=name)
+
+    # GeoTIFFs in the location's CRS are linked with r.external (no copy),
+    # others are imported with r.import; both in a worker pool. Files with
+    # the same size and mtime as at their last ingest are skipped.
+    import_folder(input_folder, mapset_path, link=link, workers=workers)
+
+    # Index the monthly maps of this mapset by time (STRDS)
+    for prefix, strds in MONTHLY_SERIES.items():
+        register_series(prefix, strds)
 
 
 
@@ -10,12 +10,30 @@ from grass.pygrass.gis import *
 import grass.script as grass
 import grass.script.setup as gsetup
 import re
+from grass_parallel import region_env, temp_name, publish, run_jobs
+from temporal import MONTHLY_SERIES, register_series
 
 
 
 
+def resample_month(year, month, env):
+    input_raster = f"imd_pcp_m_{year}_{month:02d}"
+    resampled_raster = f"imd_pcp_resamp_m_{year}_{month:02d}"
+    tmp_raster = temp_name(resampled_raster)
+
+    # This resampling only change the pixel size, will not apply any interpolation or will not change pixel value
+    gs.run_command(
+        'r.resample',
+        input=input_raster,
+        output=tmp_raster,
+        overwrite=True,
+        env=env
+    )
+    publish(tmp_raster, resampled_raster, env=env)
+
+
 # Main function
-def main(gisdb, location, mapset): 
+def main(gisdb, location, mapset, workers=None): 
 
     shapefile = 'IndiaBoundary.geojson' 
 
@@ -51,18 +69,19 @@ def main(gisdb, location, mapset):
 
 
 
+    # Each month is independent: run them in a worker pool. The region is
+    # passed to every worker through GRASS_REGION, so no worker changes the
+    # mapset region, and outputs are renamed into place when complete.
+    env = region_env()
+    jobs = []
     for year in range(int(start_yr), int(end_yr) + 1):
         for month in range(1,13):
-            input_raster = f"imd_pcp_m_{year}_{month:02d}"
-            resampled_raster = f"imd_pcp_resamp_m_{year}_{month:02d}"
-
-            # This resampling only change the pixel size, will not apply any interpolation or will not change pixel value
-            gs.run_command(
-                'r.resample',
-                input=input_raster,
-                output=resampled_raster,
-                overwrite=True
-            )
+            jobs.append((f"{year}_{month:02d}", resample_month, dict(year=year, month=month, env=env)))
+
+    timings = run_jobs(jobs, workers=workers)
+    print(f"Resampled {len(timings)} rasters")
+
+    register_series("imd_pcp_resamp_m", MONTHLY_SERIES["imd_pcp_resamp_m"])
 
 
 
@@ -10,12 +10,120 @@ from grass.pygrass.gis import *
 import grass.script as grass
 import grass.script.setup as gsetup
 import re
-
-
+from grass_parallel import region_env, temp_name, publish, run_jobs, module_has_option, default_workers
+from prefix_sums import build_prefix_sums, window_sum, window_months, crop_year_window, month_range, SEASONS, CALENDAR_YEAR
+from grass_io import raster_mtime
+from temporal import MONTHLY_SERIES, CROP_YEAR_SERIES, time_index, maps_in_range, window_interval, register_series
+
+
+
+
+def aggregate_crop_year(input_maps, output_map, env, nprocs=None):
+    tmp_map = temp_name(output_map)
+    kwargs = {'nprocs': nprocs} if nprocs else {}
+    gs.run_command('r.series', input=input_maps, output=tmp_map, method='sum', overwrite=True, env=env, **kwargs)
+    publish(tmp_map, output_map, env=env)
+
+
+def aggregate_with_prefix_sums(agri_yr_timerange, start_month, end_month, workers=None, seasonal=False):
+    # Monthly series -> base name of the cumulative stacks and annual outputs
+    series = {
+        'wapor_eta_m': 'wapor_eta',
+        'wapor_tbp_m': 'wapor_tbp',
+        'imd_pcp_resamp_m': 'imd_pcp_resamp',
+    }
+
+    env = region_env()
+    first_year = int(agri_yr_timerange[0][0].split("_")[0])
+    last_year = int(agri_yr_timerange[-1][0].split("_")[0])
+    crop_year = (start_month, end_month)
+
+    # Crop year, and with seasonal=True its seasons, are labelled by crop
+    # year (wapor_eta_zaid_2023_2024 is April-May 2024); calendar years by
+    # their year, for the same years as the crop years
+    windows = {}
+    for year in range(first_year, last_year + 1):
+        period = f"{year}_{year + 1}"
+        windows[('a', period)] = window_months(year, crop_year)
+        if seasonal:
+            for season, months in SEASONS.items():
+                windows[(season, period)] = crop_year_window(year, months, crop_year)
+            windows[('cy', str(year))] = window_months(year, CALENDAR_YEAR)
+
+    # One stack covers every window; missing monthly maps stop the run
+    stack_start = min(start for start, _ in windows.values())
+    stack_end = max(end for _, end in windows.values())
+
+    # The cumulative stacks are built once per variable (in parallel);
+    # only new or changed months are added on later runs
+    run_jobs([
+        (f"{base}_cum", build_prefix_sums,
+         dict(monthly_prefix=monthly_prefix, base=base, start=stack_start, end=stack_end, env=env))
+        for monthly_prefix, base in series.items()
+    ], workers=workers)
+
+    # Every window now reads two cumulative sums (plus their counts)
+    jobs = []
+    for (window_name, period), (start, end) in windows.items():
+        for base in series.values():
+            output = f"{base}_{window_name}_{period}"
+            jobs.append((output, window_sum,
+                         dict(base=base, start=start, end=end, output=output,
+                              stack_start=stack_start, env=env)))
+
+    timings = run_jobs(jobs, workers=workers)
+
+    print("Job timings (s):")
+    for name, seconds in sorted(timings.items()):
+        print(f"  {name}: {seconds:.1f}")
+
+
+def aggregate_with_time_index(years, window, workers=None):
+    # The months of every crop year are looked up in the time index of the
+    # monthly STRDS. Crop years whose map is newer than all their months are
+    # skipped, crop years with missing months are reported and skipped.
+    # One job per (variable, crop year). Jobs run in parallel, each with its
+    # own GRASS_REGION, and r.series uses the remaining cores when it
+    # supports nprocs.
+    env = region_env()
+
+    jobs = []
+    for monthly_prefix, annual_prefix in [('wapor_eta_m', 'wapor_eta_a'),
+                                          ('wapor_tbp_m', 'wapor_tbp_a'),
+                                          ('imd_pcp_resamp_m', 'imd_pcp_resamp_a')]:
+        index = time_index(f"{MONTHLY_SERIES[monthly_prefix]}@data_monthly", env=env)
+        for year in years:
+            output_map = f"{annual_prefix}_{year}_{year + 1}"
+            start, end = window_interval(year, window)
+            input_maps = maps_in_range(index, start, end)
+            n_months = len(month_range(*window_months(year, window)))
+            if len(input_maps) < n_months:
+                print(f"{output_map}: {len(input_maps)} of {n_months} months registered, skipping")
+                continue
+
+            output_time = raster_mtime(output_map, env=env)
+            if output_time is not None and output_time >= max(raster_mtime(m, env=env) or 0 for m in input_maps):
+                print(f"{output_map} is up to date")
+                continue
+            jobs.append((output_map, aggregate_crop_year,
+                         dict(input_maps=input_maps, output_map=output_map, env=env)))
+
+    # No more workers than jobs; the cores are split between the running jobs
+    workers = min(workers or default_workers(), max(len(jobs), 1))
+    if jobs and module_has_option('r.series', 'nprocs'):
+        nprocs = max(1, (os.cpu_count() or 1) // workers)
+        for _, _, kwargs in jobs:
+            kwargs['nprocs'] = nprocs
+
+    timings = run_jobs(jobs, workers=workers)
+
+    print("Job timings (s):")
+    for name, seconds in sorted(timings.items()):
+        print(f"  {name}: {seconds:.1f}")
 
 
 # Main function
-def main(gisdb, location, mapset): 
+def main(gisdb, location, mapset, workers=None, use_prefix_sums=False, seasonal=False): 
 
     shapefile = 'IndiaBoundary.geojson' 
 
@@ -82,23 +190,17 @@ def main(gisdb, location, mapset):
     gs.run_command('g.region', vector=vector_name, res=0.00292)
 
 
-    for y in agri_yr_timerange:
-        yr = int(y[0].split("_")[0]) 
-        yr_string = f'{yr}_{yr + 1}' 
-        print(yr_string)
-
-        eta_maps_list = [f"wapor_eta_m_{i}" for i in y]
-        eta_out_map_name = f'wapor_eta_a_{yr_string}'
-
-        tbp_maps_list = [f"wapor_tbp_m_{i}" for i in y]
-        tbp_out_map_name = f'wapor_tbp_a_{yr_string}'
-    
-        pcp_maps_list = [f"imd_pcp_resam_m_{i}" for i in y]
-        pcp_out_map_name = f'imd_pcp_resamp_a_{yr_string}'
+    # r.series is faster for a few crop years; the prefix-sum stacks pay off
+    # when many windows share months, and are the only path for the seasons
+    if use_prefix_sums or seasonal:
+        aggregate_with_prefix_sums(agri_yr_timerange, int(start_month), int(end_month), workers, seasonal)
+    else:
+        years = range(int(start_yr), int(end_yr) + 1)
+        aggregate_with_time_index(years, (int(start_month), int(end_month)), workers)
 
-        gs.run_command('r.series', input=eta_maps_list, output=eta_out_map_name, method='sum', overwrite=True)
-        gs.run_command('r.series', input=tbp_maps_list, output=tbp_out_map_name, method='sum', overwrite=True)
-        gs.run_command('r.series', input=pcp_maps_list, output=pcp_out_map_name, method='sum', overwrite=True)
+    # Index the crop year maps by time (STRDS)
+    for prefix, strds in CROP_YEAR_SERIES.items():
+        register_series(prefix, strds, crop_year_start=int(start_month))
 
 
 
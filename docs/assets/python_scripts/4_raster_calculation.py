@@ -10,6 +10,7 @@ from grass.pygrass.gis import *
 import grass.script as grass
 import grass.script.setup as gsetup
 import re
+from cropland_maps import cropland_maps
 
 
 
@@ -63,15 +64,11 @@ def main(gisdb, location, mapset):
 
 
     for y in years_str:
-        # Apply raster mask
-        # gs.run_command('r.mask', raster=f'LULC_250k_{y}', maskcats='2 3 4 5 7', overwrite=True)
-        gs.run_command('r.mask', raster=f'LULC_250k_2022_2023', maskcats='2 3 4 5 7', overwrite=True)
-
-        # Perform map calculations
-        gs.mapcalc(f"wapor_eta_a_cropland_{y} = wapor_eta_a_{y}", overwrite=True)
-        gs.mapcalc(f"wapor_tbp_a_cropland_{y} = wapor_tbp_a_{y}", overwrite=True)
-        gs.mapcalc(f"wapor_bwp_a_{y} = wapor_tbp_a_{y} / (wapor_eta_a_{y} * 10)",overwrite=True)
-        gs.run_command('r.mask', flags='r')
+        # Cropland ETa, cropland TBP and BWP in a single r.mapcalc pass over
+        # ETa, TBP and LULC; skipped when the maps are newer than the inputs
+        # lulc_map = f'LULC_250k_{y}'
+        lulc_map = 'LULC_250k_2022_2023'
+        cropland_maps(y, lulc_map)
 
 
 if __name__ == '__main__':
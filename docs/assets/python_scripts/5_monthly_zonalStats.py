@@ -17,6 +17,11 @@ import numpy as np
 import geopandas as gdf
 import pandas as pd
 import io
+from zonal_engine import ZonalLayer
+from grass_io import raster_stamp, zonal_statistics
+from zone_cache import load_zone_grid
+from stats_store import ZonalStatsStore
+from temporal import MONTHLY_SERIES, time_index
 
 
 # Main function
@@ -26,6 +31,9 @@ def main(gisdb, location, mapset):
     output_csv_path=f"IndiaStates_monthly_zonalstats.csv"
     start_yr = '2023'
     end_yr = '2024'
+    variable = 'imd_pcp'
+    zone_cache_dir = "/Volumes/ExternalSSD/eqipa_data/zone_cache"
+    stats_db_path = "/Volumes/ExternalSSD/eqipa_data/monthly_zonalstats.sqlite"
 
     os.environ['GISDBASE'] = gisdb
     os.environ['LOCATION_NAME'] = location
@@ -46,34 +54,45 @@ def main(gisdb, location, mapset):
 
     vector_name = os.path.splitext(os.path.basename(geojson_file))[0]
 
-    v.import_(input=geojson_file, output=vector_name, overwrite=True)
-    
     g.mapsets(mapset="nrsc_lulc,data_annual,data_monthly", operation="add")
 
-    gs.run_command('g.region', vector=vector_name, res=0.00292)
-
-
-    for year in range(int(start_yr), int(end_yr) + 1):
-        for month in range(1,13):
-
-            raster_name=f"imd_pcp_resam_m_{year}_{month:02d}"
-            gs.run_command('v.rast.stats', map=vector_name, raster=raster_name, 
-                   column_prefix=raster_name, 
-                #    method='percentile',
-                    # percentile=98,
-                   method='average', 
-                #    method='coeff_var', 
-                # method='stddev',
-                   overwrite=True)
-            
-    stats_output = gs.read_command(
-        'v.db.select', map=vector_name, format="csv", overwrite=True
-    )
-    
-    # Use StringIO to read the data into a Pandas DataFrame
-    data = io.StringIO(stats_output)
-    df = pd.read_csv(data)
-    
+    # Cached zone grid; also sets the region to the vector extent
+    zone_grid = load_zone_grid(geojson_file, vector_name, res=0.00292, cache_dir=zone_cache_dir)
+    with ZonalStatsStore(stats_db_path) as store:
+        # The months of the time range come from the time index of the monthly
+        # STRDS. Only months that are missing from the store, or whose source
+        # raster changed since they were computed, are scanned again
+        strds = f"{MONTHLY_SERIES['imd_pcp_resamp_m']}@data_monthly"
+        where = f"start_time >= '{start_yr}-01-01' AND start_time < '{int(end_yr) + 1}-01-01'"
+        pending = []
+        for start, _, full_name in time_index(strds, where=where):
+            year, month = start.year, start.month
+            raster_name = full_name.split('@')[0]
+            stamp = raster_stamp(full_name)
+            if stamp is None:
+                print(f"{full_name} is registered but not found, skipping")
+                continue
+            if store.is_fresh(zone_grid.key, variable, year, month, stamp):
+                continue
+            pending.append((year, month, raster_name, stamp))
+
+        print(f"{len(pending)} month(s) to compute")
+
+        if pending:
+            # All pending months in one pass, each raster read once
+            layers = [ZonalLayer(raster_name, raster_name, ["average"]) for _, _, raster_name, _ in pending]
+            stats_df = zonal_statistics(zone_grid.labels, layers, n_zones=zone_grid.n_zones)
+
+            for year, month, raster_name, stamp in pending:
+                month_df = stats_df[["cat", f"{raster_name}_average"]].rename(
+                    columns={f"{raster_name}_average": "average"}
+                )
+                store.write(zone_grid.key, variable, year, month, raster_name, stamp, month_df)
+
+        # Only the months of this run, not everything the store has collected
+        wide_df = store.wide(zone_grid.key, variable, start=(int(start_yr), 1), end=(int(end_yr), 12))
+        df = zone_grid.attributes.merge(wide_df, on="cat", how="left")
+
     # Export the DataFrame to a CSV file
     df.to_csv(output_csv_path, index=False)
 
@@ -16,14 +16,20 @@ import re
 import numpy as np
 import geopandas as gdf
 import pandas as pd
+from contextlib import ExitStack
+from eqipa_indicators import eqipa_layers, eqipa_indicators, multi_year_layers, multi_year_indicators
+from cropland_maps import report_cropland_maps
+from grass_io import zonal_statistics
+from zone_cache import load_zone_grid
 
 
 
 # Main function
-def main(gisdb, location, mapset): 
+def main(gisdb, location, mapset, years=None): 
 
     geojson_file = 'StatesBoundary.geojson'
     selectedYear="2023_2024"
+    zone_cache_dir = "/Volumes/ExternalSSD/eqipa_data/zone_cache"
 
     os.environ['GISDBASE'] = gisdb
     os.environ['LOCATION_NAME'] = location
@@ -57,24 +63,16 @@ def main(gisdb, location, mapset):
 
 
     output_excel_path=f"{vector_name}_{selectedYear}_zonalstats.xlsx"
+    if years:
+        output_excel_path=f"{vector_name}_{years[0]}-{years[-1]}_zonalstats.xlsx"
 
-    v.import_(input=geojson_file, output=vector_name, overwrite=True)
     g.mapsets(mapset="nrsc_lulc,data_annual", operation="add")
 
 
-    grass.run_command(
-        "v.to.db",
-        map=vector_name,
-        option="area",
-        columns="geographical_area_ha",
-        units="hectares",
-        overwrite=True
-    )
-
-
-    # Set the region to match the raster
-    # g.region(vector=vector_name, res=0.001)
-    g.region(vector=vector_name, res=0.001)
+    # Zone grid and attribute table (incl. geographical_area_ha) come from the
+    # cache; only the first run for this GeoJSON imports and rasterizes it.
+    # The region is set to the GeoJSON extent at res=0.001.
+    zone_grid = load_zone_grid(geojson_file, vector_name, res=0.001, cache_dir=zone_cache_dir)
     # 0.003 degrees ≈ 111 km * 0.003 ≈ 333 meters.
     # 0.001 degrees ≈ 111 km * 0.001 ≈ 111 meters.
 
@@ -84,6 +82,29 @@ def main(gisdb, location, mapset):
     # IMD PCP: 0.25 degree
 
 
+    if years:
+        # Batch mode: all crop years in one zonal pass over the same zone
+        # grid; years with the same LULC map share its class counts
+        lcc_map=f"LULC_250k_2022_2023"
+        year_maps = {}
+        with ExitStack() as stack:
+            for year in years:
+                bwp_map = stack.enter_context(report_cropland_maps(year, lcc_map, products=("bwp",)))["bwp"]
+                year_maps[year] = (lcc_map, f"wapor_eta_a_{year}", f"wapor_tbp_a_{year}",
+                                   f"imd_pcp_resamp_a_{year}", bwp_map)
+
+            layers, class_counts = multi_year_layers(year_maps)
+            stats_df = zonal_statistics(zone_grid.labels, layers, n_zones=zone_grid.n_zones)
+        g.region(flags="d")
+
+        # One row per (zone, year)
+        df = multi_year_indicators(zone_grid.attributes, stats_df, class_counts, year_maps)
+        df = df.round(2)
+        df.to_csv(output_excel_path.replace(".xlsx", ".csv"), index=False)
+        print(f"zonalstats exported successfully: {vector_name} ({len(years)} years)")
+        return
+
+
     # lcc_map=f"LULC_250k_{selectedYear}"
     lcc_map=f"LULC_250k_2022_2023"
     eta_map=f"wapor_eta_a_{selectedYear}"
@@ -92,166 +113,27 @@ def main(gisdb, location, mapset):
     bwp_map =f"wapor_bwp_a_{selectedYear}"
 
 
-    grass.parse_command(
-            'v.rast.stats',
-            map=vector_name,
-            raster=eta_map,
-            method=['average'],
-            column_prefix=f'ETa_{selectedYear}',
-            overwrite=True
-        )
-
-    grass.parse_command(
-            'v.rast.stats',
-            map=vector_name,
-            raster=pcp_map,
-            method=['average'],
-            column_prefix=f'PCP_{selectedYear}',
-            overwrite=True
-        )
-
-
-    r.mask(raster=lcc_map, maskcats='2 3 4 5 7')
-
-    grass.mapcalc(f"{bwp_map} = {tbp_map} / ({eta_map} * 10)",overwrite=True)
-
-
-    grass.parse_command(
-        'v.rast.stats',
-        map=vector_name,
-        raster=eta_map,
-        method=["average","coeff_var" ],
-        column_prefix=f'ETa_cropland_{selectedYear}',
-        overwrite=True
-    )
-    grass.parse_command(
-            "v.rast.stats",
-            map=vector_name,
-            raster=eta_map,
-            column_prefix=f'ETa_cropland_{selectedYear}',
-            method="percentile",
-            percentile=98,
-            overwrite=True,
-        )
-
-
-    grass.parse_command(
-            "v.rast.stats",
-            map=vector_name,
-            raster=tbp_map,
-            column_prefix=f'BLP_{selectedYear}',
-            method=[ "average"],
-            overwrite=True,
-        )
-
-    grass.parse_command(
-        "v.rast.stats",
-        map=vector_name,
-        raster=bwp_map,
-        column_prefix=f'BWP_{selectedYear}',
-        method=[ "average"],
-        overwrite=True,
-    )
-
-    r.mask(flags="r")
-
-    cropland_classes = {
-            'exclusive_kharif': '2',
-            'exclusive_rabi': '3',
-            'exclusive_zaid': '4',
-            'double_crop': '5',
-            'plantation': '7'
-    }
-
-    # Iterate over each class and perform zonal statistics
-    for class_name, maskcats in cropland_classes.items():
-        # Apply mask
-        r.mask(raster=lcc_map, maskcats=maskcats)
-
-        grass.parse_command(
-            "v.rast.stats",
-            map=vector_name,
-            raster=lcc_map,
-            column_prefix=f"{class_name}_pixelcount",
-            method=["number"],
-            overwrite=True,
-        )
-
-
-        # Remove mask
-        r.mask(flags="r")
-
-    output_csv_path = output_excel_path.replace(".xlsx", ".csv")
-
-    v.out_ogr(
-        input=vector_name,
-        output=output_csv_path,
-        format="CSV",
-        overwrite=True
-    )
-
-    g.region(flags="d")  
-
-
-    df = pd.read_csv(output_csv_path)
-    df = df.drop_duplicates()  
-    df.drop(columns=['cat'], inplace=True, errors='ignore')
+    # BWP over cropland: a shared map is reused only when it is newer than
+    # ETa, TBP and LULC and covers this region on the same 0.001 grid (not the
+    # 0.00292 map of 4_raster_calculation.py); otherwise it is computed for
+    # this report only (without r.mask)
+    with report_cropland_maps(selectedYear, lcc_map, products=("bwp",)) as maps:
+        bwp_map = maps["bwp"]
 
+        # Read every raster a single time over the cached zone grid; the layers,
+        # cropland mask and class crosstab are defined in eqipa_indicators.py
+        layers, class_counts = eqipa_layers(selectedYear, lcc_map, eta_map, tbp_map, pcp_map, bwp_map)
+        layers.append(class_counts)
 
-    coeff_var_col = f"ETa_cropland_{selectedYear}_coeff_var"
-    avg_col = f"ETa_cropland_{selectedYear}_average"
-    perc_98_col = f"ETa_cropland_{selectedYear}_percentile_98"
-    equity_col = f"Equity"
-    adequacy_col = f"Adequacy"
+        stats_df = zonal_statistics(zone_grid.labels, layers, n_zones=zone_grid.n_zones)
 
+    output_csv_path = output_excel_path.replace(".xlsx", ".csv")
 
-
-    # Calculate Equity and Adequacy
-    if (
-        coeff_var_col in df.columns and 
-        avg_col in df.columns and 
-        perc_98_col in df.columns and 
-        (df[coeff_var_col] != 0).any() and 
-        (df[avg_col] != 0).any() and 
-        (df[perc_98_col] != 0).any()
-    ):
-        df[equity_col] = 100 - df[coeff_var_col]
-        df[adequacy_col] = (df[avg_col] * 100) / df[perc_98_col]
-    else:
-        print(f"Columns missing for class {class_name}. Skipping Equity and Adequacy calculations.")
-
-    df.drop(columns=[ perc_98_col], errors='ignore', inplace=True)
-
-
-
-    for class_name in cropland_classes.keys():
-        pixel_count_col = f"{class_name}_pixelcount_number"
-        area_col = f"{class_name}_area_ha"  
-        # Calculate area in hectares for the class
-        if pixel_count_col in df.columns:
-            # df[area_col] = df[pixel_count_col] * 3020 / 10000  
-            df[area_col] = df[pixel_count_col] * 2978 / 10000  
-            df.drop(columns=[pixel_count_col], errors='ignore', inplace=True)
-
-
-    cropland_area_cols = [f"{class_name}_area_ha" for class_name in cropland_classes.keys()]
-    df["Cropland_Area_ha"] = df[cropland_area_cols].sum(axis=1)  # Sum all class areas
-
-    for col in [f"{class_name}_area_ha" for class_name in cropland_classes.keys()]:
-        if col not in df.columns:
-            df[col] = 0
-        df[col] = df[col].fillna(0)
+    g.region(flags="d")  
 
 
-    df["Gross_Cropped_Area_ha"] = (
-        df["exclusive_kharif_area_ha"]
-        + df["exclusive_rabi_area_ha"]
-        + df["exclusive_zaid_area_ha"]
-        + (df["double_crop_area_ha"] * 2)
-        + df["plantation_area_ha"]
-    )
-    df["Cropping_Intensity"] = df["Gross_Cropped_Area_ha"] *100/ df["Cropland_Area_ha"]
-    df["Cropping_Intensity"] = df["Cropping_Intensity"].replace([np.inf, -np.inf, np.nan], 0)
+    # Equity, Adequacy and cropland class areas
+    df = eqipa_indicators(zone_grid.attributes, stats_df, class_counts.matrix, selectedYear)
 
 
     df = df.round(2)
@@ -272,3 +154,6 @@ if __name__ == '__main__':
     # Call the main function
     main(GISDBASE, LOCATION_NAME, MAPSET)
 
+    # Batch mode: one table with a Year column for several crop years
+    # main(GISDBASE, LOCATION_NAME, MAPSET, years=["2021_2022", "2022_2023", "2023_2024"])
+
@@ -10,12 +10,55 @@ from grass.pygrass.gis import *
 import grass.script as grass
 import grass.script.setup as gsetup
 import re
-
-
+from grass_parallel import region_env, run_jobs
+
+
+# Cloud-Optimized GeoTIFF: tiled, compressed, with internal overviews, all
+# written by the GDAL COG driver in the same pass as the data.
+# PREDICTOR=YES picks horizontal differencing for integer and floating point
+# prediction for float rasters. ZSTD needs a GDAL build with zstd support.
+def cog_options(compress='DEFLATE', blocksize=512):
+    return [
+        f"COMPRESS={compress}",
+        "PREDICTOR=YES",
+        f"BLOCKSIZE={blocksize}",
+        "OVERVIEW_RESAMPLING=AVERAGE",
+        "BIGTIFF=IF_SAFER",
+    ]
+
+
+def export_raster(raster, output_tif, cog=True, compress='DEFLATE', env=None):
+    # Written next to the target and renamed when complete, so GeoServer
+    # never serves a partially written file
+    tmp_tif = output_tif.replace(".tif", ".tmp.tif")
+    if cog:
+        gs.run_command(
+            'r.out.gdal',
+            input=raster,
+            output=tmp_tif,
+            format='COG',
+            createopt=",".join(cog_options(compress)),
+            overwrite=True,
+            quiet=True,
+            env=env
+        )
+    else:
+        gs.run_command(
+            'r.out.gdal',
+            input=raster,
+            output=tmp_tif,
+            format='GTiff',
+            createopt=f"COMPRESS={compress},TILED=YES",
+            overwrite=True,
+            quiet=True,
+            env=env
+        )
+    os.replace(tmp_tif, output_tif)
+    print(f"Raster {raster} exported to {output_tif}")
 
 
 # Main function
-def main(gisdb, location, mapset): 
+def main(gisdb, location, mapset, cog=True, compress='DEFLATE', workers=None): 
 
 
     os.environ['GISDBASE'] = gisdb
@@ -57,18 +100,23 @@ def main(gisdb, location, mapset):
 
 
 
-    # Export rasters using r.out.gdal
+    # The COG driver is available from GDAL 3.1; fall back to a tiled,
+    # compressed GTiff (without overviews) on older installations
+    if cog and 'COG' not in gs.read_command('r.out.gdal', flags='l'):
+        print("GDAL COG driver not available, exporting tiled GTiff instead")
+        cog = False
+
+    # Export rasters using r.out.gdal in a worker pool. Every job gets the
+    # current region through GRASS_REGION.
+    env = region_env()
+    jobs = []
     for raster in raster_names:
         output_tif = f"{export_dir}/{raster}.tif"
-        gs.run_command(
-            'r.out.gdal',
-            input=raster,
-            output=output_tif,
-            format='GTiff',
-            # createopt="COMPRESS=LZW",
-            overwrite=True
-        )
-        print(f"Raster {raster} exported to {output_tif}")
+        jobs.append((raster, export_raster, dict(raster=raster, output_tif=output_tif,
+                                                 cog=cog, compress=compress, env=env)))
+
+    timings = run_jobs(jobs, workers=workers)
+    print(f"Exported {len(timings)} rasters")
 
 
 
@@ -0,0 +1,341 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+import shapely
+from pyproj import Geod
+from rasterio.crs import CRS
+from rasterio.features import rasterize
+from rasterio.windows import Window
+
+from zonal_engine import ZonalCrosstab, ZonalHistogram, METHODS
+from rasterio_zonal import zone_attributes, bwp, _cell_index
+from eqipa_indicators import eqipa_layers, eqipa_indicators
+
+
+# Zonal statistics on the native grid of every raster, weighted by the
+# fraction of each cell covered by the zone (like exactextract).
+#
+# Instead of resampling all rasters to a 0.001 degree zone grid, every zone
+# is intersected with the cells of each raster's own grid. Cells inside the
+# zone have weight 1; cells crossed by the zone boundary get the exact share
+# of their area inside the polygon. Mean, stddev, CV and percentiles are
+# coverage-weighted, so a 0.25 degree IMD cell half inside a zone counts half.
+# The 300 m WaPOR rasters are read at 300 m, about 9x fewer cells than the
+# oversampled grid, and small zones get no edge error from oversampling.
+#
+# A mask on another grid (the cropland classes of the 56 m LULC for the
+# 300 m ETa) becomes a fraction per value cell: the share of the LULC cells
+# (by centre) in that cell that are cropland. Class areas of a categorical
+# raster are sum(coverage x geodesic cell area) on its own grid, in m².
+
+
+class WeightedHistogram(ZonalHistogram):
+    """ZonalHistogram holding the summed weight of every (zone, bin) instead of a count."""
+
+    def __init__(self, bin_width):
+        super().__init__(bin_width)
+        self.counts = np.empty(0, dtype=np.float64)
+
+    def add(self, zones, values, weights):
+        bins = np.round(values / self.bin_width).astype(np.int64)
+        keys = (zones.astype(np.int64) << 32) + (bins + (1 << 31))
+        keys = np.concatenate([self.keys, keys])
+        weights = np.concatenate([self.counts, weights])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=weights)
+
+    def percentile_values(self, n_zones, percentile):
+        # First bin at which the cumulative weight of the zone reaches percentile %
+        result = np.full(n_zones + 1, np.nan)
+        if not self.keys.size:
+            return result
+
+        zone_ids = np.unique(self.keys >> 32)
+        cum = np.cumsum(self.counts)
+        starts = np.searchsorted(self.keys, zone_ids << 32)
+        ends = np.searchsorted(self.keys, (zone_ids + 1) << 32)
+        before = np.where(starts > 0, cum[starts - 1], 0)
+        target = before + (cum[ends - 1] - before) * percentile / 100.0
+        idx = np.minimum(np.searchsorted(cum, target), ends - 1)
+
+        bins = (self.keys[idx] & 0xFFFFFFFF) - (1 << 31)
+        result[zone_ids] = bins * self.bin_width
+        return result
+
+
+class WeightedStats:
+    """Running coverage-weighted sums of one layer, per zone.
+
+    Like zonal_engine.ZonalStats: with percentile_error the percentile comes
+    from a weighted per-zone histogram (bins of 2 * percentile_error, bounded
+    memory), without it every (value, weight) is kept for an exact percentile.
+    """
+
+    def __init__(self, n_zones, percentile=None, percentile_error=None):
+        self.n_zones = n_zones
+        self.percentile = percentile
+        self.weight = np.zeros(n_zones + 1)
+        self.sum = np.zeros(n_zones + 1)
+        self.sumsq = np.zeros(n_zones + 1)
+        self._values = {}
+        self._histogram = None
+        if percentile is not None and percentile_error:
+            self._histogram = WeightedHistogram(2 * percentile_error)
+
+    def add(self, zone, values, weights):
+        ok = np.isfinite(values) & (weights > 0)
+        v, w = values[ok], weights[ok]
+        self.weight[zone] += w.sum()
+        self.sum[zone] += (w * v).sum()
+        self.sumsq[zone] += (w * v * v).sum()
+        if self.percentile is None or not v.size:
+            return
+        if self._histogram is not None:
+            self._histogram.add(np.full(v.size, zone), v, w)
+        else:
+            self._values.setdefault(zone, []).append((v, w))
+
+    def percentile_values(self):
+        if self._histogram is not None:
+            return self._histogram.percentile_values(self.n_zones, self.percentile)
+
+        # Smallest value at which the cumulative weight reaches percentile %
+        result = np.full(self.n_zones + 1, np.nan)
+        for zone, chunks in self._values.items():
+            v = np.concatenate([c[0] for c in chunks])
+            w = np.concatenate([c[1] for c in chunks])
+            order = np.argsort(v, kind="stable")
+            cum = np.cumsum(w[order])
+            idx = np.searchsorted(cum, cum[-1] * self.percentile / 100.0)
+            result[zone] = v[order][min(idx, v.size - 1)]
+        return result
+
+    def result(self, methods):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.sum / self.weight
+            variance = np.maximum(self.sumsq / self.weight - mean * mean, 0)
+            stddev = np.sqrt(variance)
+            coeff_var = 100 * stddev / mean
+
+        columns = {}
+        for method in methods:
+            if method == "number":
+                # Covered cells (sum of the weights)
+                columns["number"] = self.weight
+            elif method == "sum":
+                columns["sum"] = np.where(self.weight > 0, self.sum, np.nan)
+            elif method == "average":
+                columns["average"] = mean
+            elif method == "stddev":
+                columns["stddev"] = stddev
+            elif method == "variance":
+                columns["variance"] = variance
+            elif method == "coeff_var":
+                columns["coeff_var"] = coeff_var
+            elif method == "percentile":
+                columns[f"percentile_{self.percentile:g}"] = self.percentile_values()
+            else:
+                raise ValueError(f"Unknown zonal method '{method}', use one of {METHODS}")
+        return columns
+
+
+def coverage_fractions(geometry, transform, shape):
+    """Fraction of every cell of the grid (transform, shape) covered by geometry."""
+    touched = rasterize([(geometry, 1)], out_shape=shape, transform=transform, fill=0,
+                        all_touched=True, dtype="uint8")
+    fractions = touched.astype(np.float64)
+
+    # Cells crossed by the boundary get the exact intersection area; every
+    # other touched cell lies completely inside
+    edge = rasterize([(geometry.boundary, 1)], out_shape=shape, transform=transform, fill=0,
+                     all_touched=True, dtype="uint8")
+    rows, cols = np.nonzero(edge)
+    if rows.size:
+        left, top = transform.c + cols * transform.a, transform.f + rows * transform.e
+        cells = shapely.box(left, top + transform.e, left + transform.a, top)
+        # Only the part of the geometry over this grid takes part in the overlay
+        part = shapely.clip_by_rect(geometry, *shapely.total_bounds(cells))
+        covered = shapely.area(shapely.intersection(cells, part))
+        fractions[rows, cols] = covered / abs(transform.a * transform.e)
+    return np.clip(fractions, 0, 1)
+
+
+def cell_areas(crs, transform, shape):
+    """Area (m²) of the cells of every row, as a (rows, 1) column."""
+    if not CRS.from_user_input(crs).is_geographic:
+        return np.full((shape[0], 1), abs(transform.a * transform.e))
+    geod = Geod(ellps="WGS84")
+    areas = []
+    for row in range(shape[0]):
+        top = transform.f + row * transform.e
+        lons = [transform.c, transform.c + transform.a, transform.c + transform.a, transform.c]
+        lats = [top, top, top + transform.e, top + transform.e]
+        areas.append(abs(geod.polygon_area_perimeter(lons, lats)[0]))
+    return np.array(areas)[:, None]
+
+
+def cover_window(src, left, bottom, right, top):
+    """Window of src holding every cell that meets the bounds, or None."""
+    inverse = ~src.transform
+    cols, rows = zip(inverse * (left, top), inverse * (right, bottom))
+    r0, r1 = max(int(np.floor(min(rows))), 0), min(int(np.ceil(max(rows))), src.height)
+    c0, c1 = max(int(np.floor(min(cols))), 0), min(int(np.ceil(max(cols))), src.width)
+    if r1 <= r0 or c1 <= c0:
+        return None
+    return Window(c0, r0, c1 - c0, r1 - r0)
+
+
+def _read(src, window):
+    data = src.read(1, window=window, masked=True)
+    return data.astype(np.float64).filled(np.nan)
+
+
+def mask_fractions(mask_src, mask_cats, transform, shape):
+    """Share of the cells of mask_src (by centre) in every cell of the grid that are in mask_cats."""
+    right = transform.c + shape[1] * transform.a
+    bottom = transform.f + shape[0] * transform.e
+    window = cover_window(mask_src, transform.c, bottom, right, transform.f)
+    if window is None:
+        return np.zeros(shape)
+
+    data = _read(mask_src, window)
+    wt = mask_src.window_transform(window)
+    rows = _cell_index(wt.f, wt.e, data.shape[0], transform.f, transform.e)
+    cols = _cell_index(wt.c, wt.a, data.shape[1], transform.c, transform.a)
+    inside = (((rows >= 0) & (rows < shape[0]))[:, None]
+              & ((cols >= 0) & (cols < shape[1]))[None, :])
+    flat = (rows[:, None] * shape[1] + cols[None, :])[inside]
+
+    n = shape[0] * shape[1]
+    total = np.bincount(flat, minlength=n)
+    hits = np.bincount(flat, weights=np.isin(data[inside], mask_cats), minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fractions = np.where(total > 0, hits / total, 0)
+    return fractions.reshape(shape)
+
+
+def native_zonal_statistics(zones, layers, sources, derived=None, block_rows=64):
+    """Coverage-weighted zonal statistics on the native grid of every raster.
+
+    zones is a GeoDataFrame (cat = feature order, from 1). sources maps
+    raster name -> GeoTIFF path; derived maps a name to (function of the
+    block, source names), computed on the grid of those sources (e.g. BWP
+    from ETa and TBP). Returns a DataFrame like zonal_engine.run_zonal_pass;
+    ZonalCrosstab layers get their zone x class matrix filled in place, as
+    areas in m² instead of pixel counts.
+    """
+    derived = derived or {}
+    crosstabs = [layer for layer in layers if isinstance(layer, ZonalCrosstab)]
+    layers = [layer for layer in layers if not isinstance(layer, ZonalCrosstab)]
+    n_zones = len(zones)
+    zone_crs = zones.crs or "EPSG:4326"
+
+    srcs = {}
+    try:
+        for name, path in sources.items():
+            srcs[name] = rasterio.open(path)
+            if srcs[name].crs and CRS.from_user_input(zone_crs) != srcs[name].crs:
+                raise ValueError(f"{path} is not in the CRS of the zones ({zone_crs})")
+
+        # Rasters on the same grid are read together, block by block
+        grid = {name: (src.transform, src.width, src.height) for name, src in srcs.items()}
+        for name, (func, inputs) in derived.items():
+            if len({grid[i] for i in inputs}) != 1:
+                raise ValueError(f"The inputs of {name} are not on one grid")
+            grid[name] = grid[inputs[0]]
+        groups = {}
+        for name in srcs:
+            groups.setdefault(grid[name], name)
+
+        accumulators = [WeightedStats(n_zones, layer.percentile if "percentile" in layer.methods else None,
+                                      layer.percentile_error)
+                        for layer in layers]
+        class_areas = [np.zeros((n_zones + 1, len(crosstab.classes))) for crosstab in crosstabs]
+        cells_read = {name: 0 for name in srcs}
+
+        for zone, geometry in enumerate(zones.geometry, start=1):
+            if geometry is None or geometry.is_empty:
+                continue
+            for key, first in groups.items():
+                group_layers = [(layer, acc) for layer, acc in zip(layers, accumulators)
+                                if grid[layer.raster] == key]
+                group_crosstabs = [(crosstab, areas) for crosstab, areas in zip(crosstabs, class_areas)
+                                   if grid[crosstab.raster] == key]
+                if not group_layers and not group_crosstabs:
+                    continue
+
+                src = srcs[first]
+                window = cover_window(src, *geometry.bounds)
+                if window is None:
+                    continue
+                names = [name for name in srcs if grid[name] == key]
+
+                for row_off in range(0, window.height, block_rows):
+                    block_window = Window(window.col_off, window.row_off + row_off,
+                                          window.width, min(block_rows, window.height - row_off))
+                    transform = src.window_transform(block_window)
+                    shape = (block_window.height, block_window.width)
+                    coverage = coverage_fractions(geometry, transform, shape)
+                    if not coverage.any():
+                        continue
+
+                    block = {}
+                    for name in names:
+                        block[name] = _read(srcs[name], block_window)
+                        cells_read[name] += coverage.size
+                    for name, (func, inputs) in derived.items():
+                        if grid[name] == key:
+                            block[name] = func(block)
+
+                    if group_crosstabs:
+                        area = coverage * cell_areas(src.crs or zone_crs, transform, shape)
+                        for crosstab, areas in group_crosstabs:
+                            values = block[crosstab.raster]
+                            for k, value in enumerate(sorted(crosstab.classes)):
+                                areas[zone, k] += area[values == value].sum()
+
+                    fractions = {}
+                    for layer, acc in group_layers:
+                        weights = coverage
+                        if layer.mask_raster:
+                            mask_key = (layer.mask_raster, tuple(layer.mask_cats))
+                            if mask_key not in fractions:
+                                if grid[layer.mask_raster] == key:
+                                    fractions[mask_key] = np.isin(block[layer.mask_raster], layer.mask_cats)
+                                else:
+                                    fractions[mask_key] = mask_fractions(srcs[layer.mask_raster],
+                                                                         layer.mask_cats, transform, shape)
+                            weights = coverage * fractions[mask_key]
+                        acc.add(zone, block[layer.raster], weights)
+    finally:
+        for src in srcs.values():
+            src.close()
+
+    for name, cells in cells_read.items():
+        print(f"{name}: {cells} cells on the native grid")
+
+    df = pd.DataFrame({"cat": np.arange(1, n_zones + 1)})
+    for layer, acc in zip(layers, accumulators):
+        for method, values in acc.result(layer.methods).items():
+            df[f"{layer.prefix}_{method}"] = values[1:]
+
+    for crosstab, areas in zip(crosstabs, class_areas):
+        names = [crosstab.classes[key] for key in sorted(crosstab.classes)]
+        crosstab.matrix = pd.DataFrame(areas[1:], columns=names, index=pd.Index(df["cat"], name="cat"))
+    return df
+
+
+def eqipa_native_zonal_stats(geojson_file, year, lcc, eta, tbp, pcp):
+    """EQIPA overview Stats table computed on the native raster grids.
+
+    Same columns as rasterio_zonal.eqipa_zonal_stats (before rounding).
+    """
+    zones = gpd.read_file(geojson_file)
+    sources = {"lcc": lcc, "eta": eta, "tbp": tbp, "pcp": pcp}
+
+    layers, class_counts = eqipa_layers(year, "lcc", "eta", "tbp", "pcp", "bwp")
+    stats_df = native_zonal_statistics(zones, layers + [class_counts], sources,
+                                       derived={"bwp": (bwp, ("eta", "tbp"))})
+    # The class matrix holds areas in m², so one "pixel" is 1 m²
+    return eqipa_indicators(zone_attributes(zones), stats_df, class_counts.matrix, year, pixel_area_m2=1)
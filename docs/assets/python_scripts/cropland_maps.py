@@ -0,0 +1,161 @@
+import math
+from contextlib import contextmanager
+import grass.script as gs
+
+from grass_io import raster_mtime
+from grass_parallel import temp_name, publish
+from eqipa_indicators import CROPLAND_CATS
+
+
+# Cropland ETa, cropland TBP and BWP of a crop year in one r.mapcalc call.
+#
+# Instead of r.mask + three separate r.mapcalc runs (each reading ETa and/or
+# TBP again), a single multi-expression r.mapcalc reads ETa, TBP and LULC
+# once per row and writes all outputs. The cropland condition replaces
+# r.mask, so the mapset MASK is not touched.
+#
+# Every output records its inputs and the region it was computed in (n, s,
+# e, w, nsres, ewres) in the map description. An output is fresh when it
+# exists, is newer than all inputs, has the same inputs and its region
+# covers the current region on the same grid; fresh maps are reused instead
+# of being computed again.
+#
+# A map on another grid is not reused: the cropland condition depends on
+# the LULC cells sampled at that resolution. The national maps of
+# 4_raster_calculation.py (res 0.00292) are therefore not used by the
+# reports, which run on the 0.001 zone grid.
+#
+# Reports (6_eqipa_zonalStats.py, zonalstats.py) run in the region of one
+# command area and never write the shared maps: report_cropland_maps uses
+# them when they are fresh on the report grid (e.g. built by cropland_maps
+# at res 0.001 over a larger area), otherwise it computes private temporary
+# maps for the report and removes them afterwards. So a map built for one
+# command area is never reused for another, and concurrent reports do not
+# overwrite each other's maps.
+
+
+PRODUCTS = ("eta", "tbp", "bwp")
+
+
+def cropland_condition(lulc_map, cats=CROPLAND_CATS):
+    return "(" + " || ".join(f"{lulc_map} == {cat}" for cat in cats) + ")"
+
+
+def cropland_map_names(year, prefix="wapor"):
+    return {
+        "eta": f"{prefix}_eta_a_cropland_{year}",
+        "tbp": f"{prefix}_tbp_a_cropland_{year}",
+        "bwp": f"{prefix}_bwp_a_{year}",
+    }
+
+
+REGION_KEYS = ("n", "s", "e", "w", "nsres", "ewres")
+
+
+def _region_text(region):
+    return " ".join(f"{key}={float(region[key])!r}" for key in REGION_KEYS)
+
+
+def _parse_region(text):
+    try:
+        region = dict(item.split("=", 1) for item in text.split())
+        return {key: float(region[key]) for key in REGION_KEYS}
+    except (KeyError, ValueError):
+        return None
+
+
+def _on_grid(offset, res):
+    return math.isclose(offset / res, round(offset / res), abs_tol=1e-6)
+
+
+def region_covers(recorded, current):
+    """True if recorded has the resolution of current, contains it and is aligned with it."""
+    if not all(math.isclose(recorded[key], current[key], rel_tol=1e-9) for key in ("nsres", "ewres")):
+        return False
+    tol = 1e-6 * min(current["nsres"], current["ewres"])
+    if (recorded["n"] < current["n"] - tol or recorded["s"] > current["s"] + tol
+            or recorded["e"] < current["e"] - tol or recorded["w"] > current["w"] + tol):
+        return False
+    return (_on_grid(recorded["n"] - current["n"], current["nsres"])
+            and _on_grid(current["w"] - recorded["w"], current["ewres"]))
+
+
+def _is_fresh(output, inputs, description, region, env=None):
+    output_time = raster_mtime(output, env=env)
+    if output_time is None:
+        return False
+    if any((raster_mtime(name, env=env) or 0) > output_time for name in inputs):
+        return False
+    recorded = (gs.raster_info(output, env=env).get('description') or '').strip('"')
+    recorded_inputs, _, recorded_region = recorded.partition("; region ")
+    if recorded_inputs != description:
+        return False
+    recorded_region = _parse_region(recorded_region)
+    return recorded_region is not None and region_covers(recorded_region, region)
+
+
+def _cropland_maps(year, lulc_map, products, prefix, cats, publish_outputs, env):
+    # Returns ({product: map name}, [temporary maps to remove])
+    eta_map = f"{prefix}_eta_a_{year}"
+    tbp_map = f"{prefix}_tbp_a_{year}"
+    inputs = [eta_map, tbp_map, lulc_map]
+    names = cropland_map_names(year, prefix)
+    outputs = {product: names[product] for product in products}
+
+    description = (f"cropland ({lulc_map} classes {' '.join(str(cat) for cat in cats)}) "
+                   f"from {eta_map}, {tbp_map}")
+    region = gs.region(env=env)
+    stale = {product: name for product, name in outputs.items()
+             if not _is_fresh(name, inputs, description, region, env=env)}
+    if not stale:
+        print(f"{year}: cropland maps up to date, reusing {', '.join(outputs.values())}")
+        return outputs, []
+
+    cropland = cropland_condition(lulc_map, cats)
+    formulas = {
+        "eta": eta_map,
+        "tbp": tbp_map,
+        "bwp": f"{tbp_map} / ({eta_map} * 10)",
+    }
+    tmp = {product: temp_name(name) for product, name in stale.items()}
+    expression = "\n".join(
+        f"{tmp[product]} = if({cropland}, {formulas[product]}, null())" for product in stale
+    )
+    gs.mapcalc(expression, overwrite=True, quiet=True, env=env)
+
+    if not publish_outputs:
+        # Private maps of this region, only used by the caller
+        outputs.update(tmp)
+        print(f"{year}: computed {', '.join(tmp.values())} for this region in one r.mapcalc pass")
+        return outputs, list(tmp.values())
+
+    for product, name in stale.items():
+        gs.run_command('r.support', map=tmp[product],
+                       description=f"{description}; region {_region_text(region)}", env=env)
+        publish(tmp[product], name, env=env)
+    print(f"{year}: wrote {', '.join(stale.values())} in one r.mapcalc pass")
+    return outputs, []
+
+
+def cropland_maps(year, lulc_map, products=PRODUCTS, prefix="wapor", cats=CROPLAND_CATS, env=None):
+    """Create the requested cropland products of a crop year in the current region if not fresh.
+
+    Returns {product: map name}.
+    """
+    outputs, _ = _cropland_maps(year, lulc_map, products, prefix, cats, True, env)
+    return outputs
+
+
+@contextmanager
+def report_cropland_maps(year, lulc_map, products=PRODUCTS, prefix="wapor", cats=CROPLAND_CATS, env=None):
+    """Cropland products for one report in the current region.
+
+    Yields {product: map name}: the shared maps when they are fresh for this
+    region, otherwise temporary maps that are removed on exit.
+    """
+    outputs, temporary = _cropland_maps(year, lulc_map, products, prefix, cats, False, env)
+    try:
+        yield outputs
+    finally:
+        if temporary:
+            gs.run_command('g.remove', type='raster', name=temporary, flags='f', quiet=True, env=env)
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+
+
+# Concurrent, resumable file downloads.
+#
+# Files are fetched by a thread pool; every thread keeps its own
+# requests.Session so connections to the same host are reused. Data is
+# written to "<file>.part" and an interrupted download continues from the
+# end of the .part file with an HTTP Range request (servers that ignore
+# Range simply send the whole file again). The ETag or Last-Modified of the
+# .part is kept in "<file>.part.validator" and sent as If-Range, so a file
+# that changed on the server is sent whole instead of being spliced onto
+# the old prefix; a .part without a validator is downloaded again from the
+# start. A finished file is checked
+# against the expected size/sha256 (if given) and the Content-Length, then
+# renamed into place and recorded in a JSON manifest, so the next run skips
+# it without contacting the server.
+
+
+MANIFEST_NAME = "download_manifest.json"
+
+# Server-side and rate-limit errors are worth another attempt; other HTTP
+# errors (e.g. 404 for a month that is not published yet) are not
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class Download:
+    url: str
+    filename: str
+    # Form data; if given the request is sent as POST (e.g. the IMD portal)
+    data: dict = None
+    size: int = None
+    sha256: str = None
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Completed downloads of one folder, saved as JSON after every change."""
+
+    def __init__(self, folder, name=MANIFEST_NAME):
+        self.path = os.path.join(folder, name)
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def is_complete(self, download, path):
+        entry = self.entries.get(download.filename)
+        if entry is None or entry["url"] != download.url or not os.path.exists(path):
+            return False
+        if download.sha256 and entry.get("sha256") != download.sha256:
+            return False
+        return os.path.getsize(path) == entry["size"]
+
+    def add(self, download, path, sha256):
+        with self._lock:
+            self.entries[download.filename] = {
+                "url": download.url,
+                "size": os.path.getsize(path),
+                "sha256": sha256,
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+class DownloadError(Exception):
+    pass
+
+
+_local = threading.local()
+
+
+def _session():
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def _expected_size(response, offset):
+    # Total file size from Content-Range ("bytes 100-199/200") or Content-Length
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range and not content_range.endswith("*"):
+        return int(content_range.rsplit("/", 1)[1])
+    if "Content-Length" in response.headers:
+        length = int(response.headers["Content-Length"])
+        return length + offset if response.status_code == 206 else length
+    return None
+
+
+def _validator(response):
+    # If-Range takes a strong ETag or a Last-Modified date
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def _discard(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def fetch(download, path, chunk_size=1 << 16, timeout=60):
+    """Download to path + ".part", resuming a previous partial file."""
+    part_path = path + ".part"
+    validator_path = part_path + ".validator"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = None
+    if offset and os.path.exists(validator_path):
+        with open(validator_path) as f:
+            validator = f.read().strip() or None
+    if validator is None:
+        # Without a validator the .part cannot be matched to the server's file
+        offset = 0
+    headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else {}
+    method = "POST" if download.data is not None else "GET"
+
+    with _session().request(method, download.url, data=download.data, headers=headers,
+                            stream=True, timeout=timeout) as response:
+        if response.status_code == 416:
+            # Range starts at or past the end: the .part is only complete if
+            # it has exactly the size of the file ("bytes */N")
+            content_range = response.headers.get("Content-Range", "")
+            total = content_range.rsplit("/", 1)[1] if "/" in content_range else "*"
+            expected = int(total) if total.isdigit() else download.size
+            if expected is None or offset != expected:
+                _discard(part_path, validator_path)
+                raise DownloadError(f"{download.filename}: partial file of {offset} bytes does not match "
+                                    f"the file on the server ({expected or 'unknown'} bytes), starting again")
+        else:
+            response.raise_for_status()
+            if response.status_code != 206:
+                # Whole file (Range ignored, or the file changed since the .part)
+                offset = 0
+                validator = _validator(response)
+                if validator:
+                    with open(validator_path, "w") as f:
+                        f.write(validator)
+                else:
+                    _discard(validator_path)
+            expected = _expected_size(response, offset)
+            with open(part_path, "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+
+    size = os.path.getsize(part_path)
+    if expected is not None and size > expected:
+        _discard(part_path, validator_path)
+        raise DownloadError(f"{download.filename}: got {size} bytes, more than {expected}")
+    if expected is not None and size != expected:
+        raise DownloadError(f"{download.filename}: got {size} of {expected} bytes")
+    if download.size is not None and size != download.size:
+        _discard(part_path, validator_path)
+        raise DownloadError(f"{download.filename}: size {size}, expected {download.size}")
+
+    sha256 = file_sha256(part_path)
+    if download.sha256 and sha256 != download.sha256.lower():
+        _discard(part_path, validator_path)
+        raise DownloadError(f"{download.filename}: checksum mismatch")
+
+    os.replace(part_path, path)
+    _discard(validator_path)
+    return sha256
+
+
+def _retry_delay(error, attempt, backoff):
+    # Exponential backoff; a Retry-After in seconds (429/503) is honoured
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.isdigit():
+        return float(retry_after)
+    return backoff * 2 ** (attempt - 1)
+
+
+def download_all(downloads, output_folder, workers=4, retries=3, chunk_size=1 << 16, backoff=1.0):
+    """Download all files into output_folder with a pool of workers.
+
+    Files already in the manifest are skipped. A failed transfer, a 5xx or a
+    429 is retried up to `retries` times with exponential backoff, continuing
+    from the partial file. Other HTTP errors fail at once.
+    Returns {filename: path} of the files that are available.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    manifest = Manifest(output_folder)
+    done = {}
+
+    def run(download):
+        path = os.path.join(output_folder, download.filename)
+        if manifest.is_complete(download, path):
+            print(f"✅ {download.filename} already downloaded, skipping...")
+            return path
+
+        for attempt in range(1, retries + 1):
+            try:
+                sha256 = fetch(download, path, chunk_size=chunk_size)
+                break
+            except (requests.RequestException, DownloadError) as e:
+                if isinstance(e, requests.HTTPError) and e.response.status_code not in RETRY_STATUS:
+                    raise
+                if attempt == retries:
+                    raise
+                delay = _retry_delay(e, attempt, backoff)
+                print(f"Retrying {download.filename} in {delay:.0f} s ({attempt}/{retries}): {e}")
+                time.sleep(delay)
+
+        manifest.add(download, path, sha256)
+        print(f"Downloaded {download.filename} successfully.")
+        return path
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, download): download for download in downloads}
+        for future in as_completed(futures):
+            download = futures[future]
+            try:
+                done[download.filename] = future.result()
+            except Exception as e:
+                print(f"❌ Failed to download {download.filename}: {e}")
+
+    return done
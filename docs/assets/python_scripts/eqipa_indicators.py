@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from zonal_engine import ZonalLayer, ZonalCrosstab
+
+
+# EQIPA overview indicators of one crop year.
+#
+# The layer definitions and the derivation of Equity, Adequacy and the
+# cropland class areas are shared by the GRASS scripts and the GRASS-free
+# (rasterio) engine, so both produce the same columns.
+#
+# Several crop years can be computed in one zonal pass: the layers of all
+# years are read together and years with the same LULC map share one class
+# crosstab (and one read of the LULC map). The result has one row per
+# (zone, year) with the year-free column names and a Year column.
+
+
+CROPLAND_CLASSES = {
+    'exclusive_kharif': '2',
+    'exclusive_rabi': '3',
+    'exclusive_zaid': '4',
+    'double_crop': '5',
+    'plantation': '7'
+}
+CROPLAND_CATS = (2, 3, 4, 5, 7)
+
+# Legacy area factor (m² per pixel) carried over from the original report, so
+# class areas stay comparable with earlier reports. It is not the area of a
+# 0.001 degree cell, which is about 11,000-12,300 m² at Indian latitudes.
+PIXEL_AREA_M2 = 2978
+
+
+def eqipa_layers(year, lcc_map, eta_map, tbp_map, pcp_map, bwp_map):
+    """Zonal layers of the overview report and the cropland class crosstab."""
+    # The cropland mask is applied per layer instead of with r.mask
+    cropland = dict(mask_raster=lcc_map, mask_cats=CROPLAND_CATS)
+
+    layers = [
+        ZonalLayer(f'ETa_{year}', eta_map, ["average"]),
+        ZonalLayer(f'PCP_{year}', pcp_map, ["average"]),
+        # percentile_98 from a per-zone histogram (error <= 0.05 mm), same pass as mean/CV
+        ZonalLayer(f'ETa_cropland_{year}', eta_map, ["average", "coeff_var", "percentile"],
+                   percentile_error=0.05, **cropland),
+        ZonalLayer(f'BLP_{year}', tbp_map, ["average"], **cropland),
+        ZonalLayer(f'BWP_{year}', bwp_map, ["average"], **cropland),
+    ]
+
+    # Pixel count of every (zone, cropland class) pair, counted in the same pass
+    class_counts = ZonalCrosstab(lcc_map, {int(cat): name for name, cat in CROPLAND_CLASSES.items()})
+    return layers, class_counts
+
+
+def eqipa_indicators(attributes, stats_df, class_counts, year, pixel_area_m2=PIXEL_AREA_M2):
+    """Stats table: attributes + zonal stats + Equity/Adequacy + class areas.
+
+    class_counts is the zone x class pixel count matrix (index "cat") of the
+    ZonalCrosstab from eqipa_layers.
+    """
+    df = attributes.copy()
+    df = df.merge(stats_df, on="cat", how="left")
+    df = df.drop_duplicates()
+
+    coeff_var_col = f"ETa_cropland_{year}_coeff_var"
+    avg_col = f"ETa_cropland_{year}_average"
+    perc_98_col = f"ETa_cropland_{year}_percentile_98"
+    equity_col = f"Equity"
+    adequacy_col = f"Adequacy"
+
+    # Calculate Equity and Adequacy
+    if (
+        coeff_var_col in df.columns and
+        avg_col in df.columns and
+        perc_98_col in df.columns and
+        (df[coeff_var_col] != 0).any() and
+        (df[avg_col] != 0).any() and
+        (df[perc_98_col] != 0).any()
+    ):
+        df[equity_col] = 100 - df[coeff_var_col]
+        df[adequacy_col] = (df[avg_col] * 100) / df[perc_98_col]
+    else:
+        print("Columns missing. Skipping Equity and Adequacy calculations.")
+
+    df.drop(columns=[perc_98_col], errors='ignore', inplace=True)
+
+    # Class areas, cropland, gross cropped area and cropping intensity
+    # from the zone x class pixel count matrix
+    class_area_ha = class_counts * pixel_area_m2 / 10000
+
+    area_df = class_area_ha.add_suffix("_area_ha")
+    area_df["Cropland_Area_ha"] = class_area_ha.sum(axis=1)
+    area_df["Gross_Cropped_Area_ha"] = (
+        class_area_ha["exclusive_kharif"]
+        + class_area_ha["exclusive_rabi"]
+        + class_area_ha["exclusive_zaid"]
+        + (class_area_ha["double_crop"] * 2)
+        + class_area_ha["plantation"]
+    )
+    area_df["Cropping_Intensity"] = area_df["Gross_Cropped_Area_ha"] *100/ area_df["Cropland_Area_ha"]
+    area_df["Cropping_Intensity"] = area_df["Cropping_Intensity"].replace([np.inf, -np.inf, np.nan], 0)
+
+    df = df.join(area_df, on="cat")
+    df.drop(columns=['cat'], inplace=True, errors='ignore')
+    return df
+
+
+def multi_year_layers(year_maps):
+    """Layers of several crop years for one zonal pass.
+
+    year_maps is {year: (lcc_map, eta_map, tbp_map, pcp_map, bwp_map)}.
+    Returns (layers, {lcc_map: class crosstab}); the crosstabs are included
+    in the layers, one per distinct LULC map.
+    """
+    layers, class_counts = [], {}
+    for year, maps in year_maps.items():
+        year_layers, counts = eqipa_layers(year, *maps)
+        layers += year_layers
+        class_counts.setdefault(maps[0], counts)
+    layers += class_counts.values()
+    return layers, class_counts
+
+
+def multi_year_indicators(attributes, stats_df, class_counts, year_maps, pixel_area_m2=PIXEL_AREA_M2):
+    """Stats table of several crop years, one row per (zone, year).
+
+    class_counts is the {lcc_map: crosstab} of multi_year_layers.
+    """
+    frames = []
+    for year, maps in year_maps.items():
+        year_stats = stats_df[["cat"] + [c for c in stats_df.columns if f"_{year}_" in c]]
+        df = eqipa_indicators(attributes, year_stats, class_counts[maps[0]].matrix, year, pixel_area_m2)
+        df = df.rename(columns=lambda c: c.replace(f"_{year}_", "_"))
+        df.insert(0, "Year", year)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,146 @@
+import os
+import importlib
+import grass.script as gs
+import grass.script.setup as gsetup
+
+from grass_parallel import region_env
+from grass_session_pool import GrassSession
+from cropland_maps import cropland_maps, cropland_map_names
+from grass_import import import_file
+from pipeline import Task, run_pipeline
+from temporal import MONTHLY_SERIES, CROP_YEAR_SERIES, register_series
+
+# The numbered scripts are not valid module names for a plain import
+resampling = importlib.import_module("2_resampling")
+annual_maps = importlib.import_module("3_annual_maps")
+export_geotiff = importlib.import_module("7_export_geotiff")
+
+
+# Scripts 1-4 and 7 as one task graph, per month and per crop year:
+#
+#   {folder}/imd_pcp_m_*.tif -> imd_pcp_m_* -> imd_pcp_resamp_m_* -> imd_pcp_resamp_a_*
+#                                                                 -> pcp_resamp/*.tif
+#   {folder}/wapor_eta_m_*.tif -> wapor_eta_m_* -> wapor_eta_a_* -+
+#   {folder}/wapor_tbp_m_*.tif -> wapor_tbp_m_* -> wapor_tbp_a_* -+-> cropland ETa/TBP, BWP
+#
+# Monthly maps are written to the monthly mapset, crop year maps to the
+# annual mapset. The zonal statistics (5, 6) keep their own freshness checks
+# (stats store, report cache) and read the maps written here.
+
+
+def crop_year_months(year, start_month=6, end_month=5):
+    # June - May: 2023 -> 2023_06 ... 2024_05
+    if start_month > end_month:
+        return ([(year, m) for m in range(start_month, 13)]
+                + [(year + 1, m) for m in range(1, end_month + 1)])
+    return [(year, m) for m in range(start_month, end_month + 1)]
+
+
+def eqipa_tasks(years, source_folders, export_dir, lulc_map, monthly_env, annual_env, cog=True):
+    tasks = []
+    months = sorted({ym for year in years for ym in crop_year_months(year)})
+
+    # 1: import the monthly GeoTIFFs
+    for prefix, folder in source_folders.items():
+        for year, month in months:
+            name = f"{prefix}_{year}_{month:02d}"
+            tasks.append(Task(
+                f"import {name}", import_file,
+                dict(full_path=os.path.join(folder, f"{name}.tif"), name=name, env=monthly_env),
+                input_files=[os.path.join(folder, f"{name}.tif")], outputs=[name], env=monthly_env,
+            ))
+
+    # 2: resample the precipitation, 7: export the resampled months
+    for year, month in months:
+        input_map = f"imd_pcp_m_{year}_{month:02d}"
+        output_map = f"imd_pcp_resamp_m_{year}_{month:02d}"
+        tasks.append(Task(
+            f"resample {output_map}", resampling.resample_month,
+            dict(year=year, month=month, env=monthly_env),
+            inputs=[input_map], outputs=[output_map], env=monthly_env,
+        ))
+
+        output_tif = os.path.join(export_dir, f"{output_map}.tif")
+        tasks.append(Task(
+            f"export {output_map}", export_geotiff.export_raster,
+            dict(raster=output_map, output_tif=output_tif, cog=cog, env=monthly_env),
+            inputs=[output_map], output_files=[output_tif], env=monthly_env,
+        ))
+
+    # 3: crop year sums, 4: cropland maps and BWP
+    for year in years:
+        year_str = f"{year}_{year + 1}"
+        ym = [f"{y}_{m:02d}" for y, m in crop_year_months(year)]
+        for monthly_prefix, annual_map in [("wapor_eta_m", f"wapor_eta_a_{year_str}"),
+                                           ("wapor_tbp_m", f"wapor_tbp_a_{year_str}"),
+                                           ("imd_pcp_resamp_m", f"imd_pcp_resamp_a_{year_str}")]:
+            input_maps = [f"{monthly_prefix}_{i}" for i in ym]
+            tasks.append(Task(
+                f"annual {annual_map}", annual_maps.aggregate_crop_year,
+                dict(input_maps=input_maps, output_map=annual_map, env=annual_env),
+                inputs=input_maps, outputs=[annual_map], env=annual_env,
+            ))
+
+        tasks.append(Task(
+            f"cropland {year_str}", cropland_maps,
+            dict(year=year_str, lulc_map=lulc_map, env=annual_env),
+            inputs=[f"wapor_eta_a_{year_str}", f"wapor_tbp_a_{year_str}", lulc_map],
+            outputs=list(cropland_map_names(year_str).values()), env=annual_env,
+        ))
+
+    return tasks
+
+
+# Main function
+def main(gisdb, location, workers=None, force=False, dry_run=False):
+
+    shapefile = 'IndiaBoundary.geojson'
+    years = range(2023, 2023 + 1)
+    source_folders = {
+        "imd_pcp_m": "/Volumes/ExternalSSD/eqipa_data/pcp_imd_monthly",
+        "wapor_eta_m": "/Volumes/ExternalSSD/eqipa_data/wapor_eta_monthly",
+        "wapor_tbp_m": "/Volumes/ExternalSSD/eqipa_data/wapor_tbp_monthly",
+    }
+    export_dir = "/Volumes/ExternalSSD/eqipa_data/pcp_resamp"
+    lulc_map = 'LULC_250k_2022_2023'
+
+    os.makedirs(export_dir, exist_ok=True)
+
+    # GISBASE and the GRASS python paths; the tasks use the mapset sessions
+    gsetup.init(gisdb, location, 'PERMANENT')
+    monthly = GrassSession(gisdb, location, "data_monthly")
+    annual = GrassSession(gisdb, location, "data_annual", search_path=["data_monthly", "nrsc_lulc"])
+    monthly.start()
+    annual.start()
+
+    try:
+        vector_name = os.path.splitext(os.path.basename(shapefile))[0]
+        if not gs.find_file(vector_name, element='vector', env=monthly.env)['file']:
+            gs.run_command('v.import', input=shapefile, output=vector_name, env=monthly.env)
+
+        # Same region for both mapsets, passed through GRASS_REGION
+        monthly_env = region_env(monthly.env, vector=f"{vector_name}@data_monthly", res=0.00292)
+        annual_env = region_env(annual.env, vector=f"{vector_name}@data_monthly", res=0.00292)
+
+        tasks = eqipa_tasks(years, source_folders, export_dir, lulc_map, monthly_env, annual_env)
+        run_pipeline(tasks, workers=workers, force=force, dry_run=dry_run)
+
+        # Index the new monthly and crop year maps by time (STRDS)
+        if not dry_run:
+            for prefix, strds in MONTHLY_SERIES.items():
+                register_series(prefix, strds, env=monthly.env)
+            for prefix, strds in CROP_YEAR_SERIES.items():
+                register_series(prefix, strds, env=annual.env)
+    finally:
+        monthly.close()
+        annual.close()
+
+
+
+
+if __name__ == '__main__':
+    GISDBASE = "/Volumes/ExternalSSD/eqipa_data/grassdata"
+    LOCATION_NAME = "eqipa"
+
+    # Call the main function
+    main(GISDBASE, LOCATION_NAME)
@@ -0,0 +1,113 @@
+import os
+import json
+import threading
+import grass.script as gs
+
+from grass_parallel import temp_name, publish, run_jobs
+
+
+# Bulk ingest of GeoTIFFs into a mapset.
+#
+# A file in the CRS of the location is registered with r.external: GRASS
+# only writes a link to the GeoTIFF (no copy), so this is a metadata
+# operation. The GeoTIFF must then stay in place, since the raster is read
+# from it. Files in another CRS are reprojected and copied with r.import.
+# All files are processed by a worker pool.
+#
+# Every ingested file is recorded with its size and mtime in
+# import_manifest.json in the mapset directory; unchanged files whose map
+# still exists are skipped on the next run.
+
+
+MANIFEST_NAME = "import_manifest.json"
+
+
+def projection_matches(full_path, env=None):
+    # Projection check only (-j), the same test r.import uses
+    return gs.run_command('r.external', input=full_path, flags='j', errors='status',
+                          quiet=True, env=env) == 0
+
+
+def import_file(full_path, name, link=True, env=None):
+    """Link (r.external) or import (r.import) a GeoTIFF as raster name.
+
+    The map is written under a temporary name and renamed when complete.
+    Returns "linked" or "imported".
+    """
+    tmp_name = temp_name(name)
+    if link and projection_matches(full_path, env=env):
+        gs.run_command('r.external', input=full_path, output=tmp_name, overwrite=True, quiet=True, env=env)
+        mode = "linked"
+    else:
+        gs.run_command('r.import', input=full_path, output=tmp_name, overwrite=True, quiet=True, env=env)
+        mode = "imported"
+    publish(tmp_name, name, env=env)
+    return mode
+
+
+class ImportManifest:
+    """Ingested files of one mapset, saved as JSON after every change."""
+
+    def __init__(self, mapset_dir, name=MANIFEST_NAME):
+        self.mapset_dir = mapset_dir
+        self.path = os.path.join(mapset_dir, name)
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def is_current(self, name, full_path):
+        entry = self.entries.get(name)
+        if entry is None or entry["path"] != os.path.abspath(full_path):
+            return False
+        if not os.path.exists(os.path.join(self.mapset_dir, 'cellhd', name)):
+            return False
+        st = os.stat(full_path)
+        return st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]
+
+    def add(self, name, full_path, mode):
+        st = os.stat(full_path)
+        with self._lock:
+            self.entries[name] = {
+                "path": os.path.abspath(full_path),
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "mode": mode,
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+def import_folder(input_folder, mapset_dir, link=True, workers=None, env=None):
+    """Ingest all .tif files of input_folder, named after the file.
+
+    Returns {"linked": n, "imported": n, "unchanged": n}.
+    """
+    manifest = ImportManifest(mapset_dir)
+    counts = {"linked": 0, "imported": 0, "unchanged": 0}
+    lock = threading.Lock()
+
+    def ingest(full_path, name):
+        mode = import_file(full_path, name, link=link, env=env)
+        manifest.add(name, full_path, mode)
+        with lock:
+            counts[mode] += 1
+
+    jobs = []
+    for file in sorted(os.listdir(input_folder)):
+        if not file.endswith(".tif"):
+            continue
+        full_path = os.path.join(input_folder, file)
+        name = os.path.splitext(file)[0]
+        if manifest.is_current(name, full_path):
+            counts["unchanged"] += 1
+            continue
+        jobs.append((name, ingest, dict(full_path=full_path, name=name)))
+
+    print(f"{counts['unchanged']} file(s) unchanged, {len(jobs)} to ingest")
+    run_jobs(jobs, workers=workers)
+    print(f"Linked {counts['linked']}, imported {counts['imported']} raster(s)")
+    return counts
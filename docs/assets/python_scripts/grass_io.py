@@ -0,0 +1,161 @@
+import io
+import os
+import subprocess
+import numpy as np
+import pandas as pd
+import grass.script as gs
+
+from zonal_engine import run_zonal_pass
+
+
+# Helpers to stream GRASS rasters into numpy without going through the
+# attribute table. Rasters are read with r.out.bin (output=-) in the current
+# computational region, row block by row block, so memory use does not grow
+# with the size of the region.
+
+
+def rasterize_zones(vector_name, output=None, env=None):
+    # Rasterize the zones once; cell value = vector category
+    output = output or f"{vector_name}_zones"
+    gs.run_command(
+        'v.to.rast',
+        input=vector_name,
+        output=output,
+        use='cat',
+        type='area',
+        overwrite=True,
+        quiet=True,
+        env=env
+    )
+    return output
+
+
+def read_attributes(vector_name, env=None):
+    stats_output = gs.read_command('v.db.select', map=vector_name, format="csv", env=env)
+    return pd.read_csv(io.StringIO(stats_output))
+
+
+def _stamp(mapset_dir, base, fullname):
+    parts = []
+    for element in ('cellhd', 'cell', 'fcell'):
+        path = os.path.join(mapset_dir, element, base)
+        if os.path.exists(path):
+            st = os.stat(path)
+            parts.append(f"{element}:{st.st_mtime_ns}:{st.st_size}")
+    return f"{fullname}|" + "|".join(parts)
+
+
+def raster_stamp(name, env=None):
+    """Modification stamp of a GRASS raster, or None if it does not exist.
+
+    Built from mtime and size of the header and data files, so it changes
+    whenever the map is rewritten (r.import, r.mapcalc ..., overwrite=True).
+    """
+    info = gs.find_file(name, element='cellhd', env=env)
+    if not info['file']:
+        return None
+
+    mapset_dir = os.path.dirname(os.path.dirname(info['file']))
+    return _stamp(mapset_dir, os.path.basename(info['file']), info['fullname'])
+
+
+def raster_stamps(names, env=None):
+    """{name: raster_stamp} for several rasters with two GRASS calls in total.
+
+    The rasters are looked up in the mapset search path directly on disk
+    instead of one g.findfile call per raster.
+    """
+    gisenv = gs.gisenv(env=env)
+    location_dir = os.path.join(gisenv['GISDBASE'], gisenv['LOCATION_NAME'])
+    search_path = gs.read_command('g.mapsets', flags='p', env=env).split()
+
+    stamps = {}
+    for name in names:
+        base, _, mapset = name.partition('@')
+        stamps[name] = None
+        for candidate in ([mapset] if mapset else search_path):
+            mapset_dir = os.path.join(location_dir, candidate)
+            if os.path.exists(os.path.join(mapset_dir, 'cellhd', base)):
+                stamps[name] = _stamp(mapset_dir, base, f"{base}@{candidate}")
+                break
+    return stamps
+
+
+def raster_mtime(name, env=None):
+    """Latest modification time (ns) of a GRASS raster, or None."""
+    info = gs.find_file(name, element='cellhd', env=env)
+    if not info['file']:
+        return None
+
+    mapset_dir = os.path.dirname(os.path.dirname(info['file']))
+    base = os.path.basename(info['file'])
+    paths = [os.path.join(mapset_dir, element, base) for element in ('cellhd', 'cell', 'fcell')]
+    return max(os.stat(path).st_mtime_ns for path in paths if os.path.exists(path))
+
+
+def _open_raster(name, integer, env=None):
+    if integer:
+        # Zone labels: int32, no-data written as 0 (= outside every zone)
+        return gs.start_command(
+            'r.out.bin', flags='i', input=name, output='-', bytes=4, null=0,
+            quiet=True, stdout=subprocess.PIPE, env=env
+        ), np.dtype(np.int32)
+
+    return gs.start_command(
+        'r.out.bin', flags='f', input=name, output='-', bytes=4, null='nan',
+        quiet=True, stdout=subprocess.PIPE, env=env
+    ), np.dtype(np.float32)
+
+
+def read_blocks(rasters, zone_map=None, block_rows=256, env=None):
+    """Yield dicts of row blocks for all rasters, reading each raster once.
+
+    If zone_map is given it is returned under the key "zones": either a GRASS
+    raster read as int32 labels, or an int32 array (e.g. a cached memmap)
+    covering the current region.
+    """
+    region = gs.region(env=env)
+    rows, cols = int(region['rows']), int(region['cols'])
+
+    zone_array = None
+    readers = {}
+    if isinstance(zone_map, np.ndarray):
+        if zone_map.shape != (rows, cols):
+            raise ValueError(f"Zone grid {zone_map.shape} does not match the region ({rows}, {cols})")
+        zone_array = zone_map
+    elif zone_map:
+        readers["zones"] = _open_raster(zone_map, integer=True, env=env)
+    for name in dict.fromkeys(rasters):
+        readers[name] = _open_raster(name, integer=False, env=env)
+
+    completed = False
+    try:
+        for start in range(0, rows, block_rows):
+            n = min(block_rows, rows - start)
+            block = {}
+            if zone_array is not None:
+                block["zones"] = np.asarray(zone_array[start:start + n])
+            for key, (proc, dtype) in readers.items():
+                data = proc.stdout.read(n * cols * dtype.itemsize)
+                block[key] = np.frombuffer(data, dtype=dtype).reshape(n, cols)
+            yield block
+        completed = True
+    finally:
+        for key, (proc, dtype) in readers.items():
+            proc.stdout.close()
+            if not completed:
+                # Stopped early (or failed): r.out.bin exits on the closed
+                # pipe, which is not an error of the read
+                proc.terminate()
+                proc.wait()
+            elif proc.wait() != 0:
+                raise RuntimeError(f"r.out.bin failed for {key}")
+
+
+def zonal_statistics(zone_map, layers, n_zones=None, block_rows=256, env=None):
+    """Run all layers over the zones in a single pass per input raster."""
+    if n_zones is None:
+        n_zones = int(gs.raster_info(zone_map, env=env)['max'] or 0)
+    rasters = [name for layer in layers for name in layer.rasters()]
+    blocks = read_blocks(rasters, zone_map=zone_map, block_rows=block_rows, env=env)
+    return run_zonal_pass(blocks, layers, n_zones)
@@ -0,0 +1,78 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import grass.script as gs
+from grass.script.task import get_interface_description
+
+
+# Run independent GRASS jobs in parallel from one session.
+#
+# GRASS keeps one region (WIND) and one MASK per mapset, so parallel jobs must
+# not call g.region or r.mask. Instead every job gets its own environment with
+# GRASS_REGION set, which overrides the region for that process only. The
+# GRASS modules run as subprocesses, so a thread pool is enough to use N cores.
+
+
+def region_env(env=None, **region):
+    """Copy of the environment with the region set through GRASS_REGION.
+
+    Without keyword arguments the current region is frozen into the copy.
+    """
+    env = dict(env or os.environ)
+    env['GRASS_REGION'] = gs.region_env(env=env, **region)
+    return env
+
+
+def module_has_option(module, option):
+    # e.g. r.series has nprocs only in newer GRASS versions
+    description = get_interface_description(module)
+    if isinstance(description, bytes):
+        description = description.decode(errors='replace')
+    return f'name="{option}"' in description
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def temp_name(output):
+    # Unique name in the same mapset; renamed to output when the job is done
+    return f"tmp_{uuid.uuid4().hex[:8]}_{output}"
+
+
+def publish(tmp_output, output, element='raster', env=None):
+    # g.rename only touches the mapset directory entries, so readers see
+    # either the old map or the complete new one
+    gs.run_command('g.rename', **{element: f"{tmp_output},{output}"}, overwrite=True, quiet=True, env=env)
+
+
+def run_jobs(jobs, workers=None):
+    """Run jobs in a thread pool.
+
+    jobs is a list of (name, function, kwargs). Returns {name: seconds} and
+    raises the first error after all jobs have finished.
+    """
+    workers = workers or default_workers()
+    timings = {}
+    errors = []
+
+    def timed(name, func, kwargs):
+        start = time.perf_counter()
+        func(**kwargs)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(timed, name, func, kwargs): name for name, func, kwargs in jobs}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                timings[name] = future.result()
+                print(f"{name} done in {timings[name]:.1f}s")
+            except Exception as e:
+                print(f"{name} failed: {e}")
+                errors.append(e)
+
+    if errors:
+        raise errors[0]
+    return timings
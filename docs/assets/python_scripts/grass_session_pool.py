@@ -0,0 +1,147 @@
+import os
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+import grass.script as gs
+import grass.script.setup as gsetup
+
+
+# Pool of warm GRASS sessions for long-running workers (e.g. Celery).
+#
+# Every slot is a GRASS session in its own mapset ({prefix}_{i}) with its own
+# GISRC file, so slots never share a region or a MASK. The expensive part of
+# a session (mapset check/creation, g.mapsets search path) is done once when
+# the pool starts. A task checks a slot out, runs GRASS modules with the
+# slot's env, and returns it; on return only the MASK and the region are
+# reset. A slot that fails its health check is rebuilt. A slot always goes
+# back to the pool, also when its reset or rebuild fails; a broken slot is
+# rebuilt by its next checkout, and failures are logged.
+
+
+logger = logging.getLogger(__name__)
+
+
+class GrassSession:
+    def __init__(self, gisdb, location, mapset, search_path=()):
+        self.gisdb = gisdb
+        self.location = location
+        self.mapset = mapset
+        self.search_path = list(search_path)
+        self.gisrc = None
+        self.env = None
+        self.tasks = 0
+
+    def start(self):
+        mapset_path = os.path.join(self.gisdb, self.location, self.mapset)
+        if not os.path.exists(mapset_path):
+            print(f"Mapset '{self.mapset}' does not exist. Creating new mapset...")
+            self.gisrc, self.env = gs.create_environment(self.gisdb, self.location, 'PERMANENT')
+            gs.run_command('g.mapset', flags='c', mapset=self.mapset, location=self.location,
+                           dbase=self.gisdb, quiet=True, env=self.env)
+            os.remove(self.gisrc)
+
+        self.gisrc, self.env = gs.create_environment(self.gisdb, self.location, self.mapset)
+        if self.search_path:
+            gs.run_command('g.mapsets', mapset=",".join(self.search_path), operation="add",
+                           quiet=True, env=self.env)
+        print(f"GRASS session ready in {self.gisdb}/{self.location}/{self.mapset}")
+
+    def reset(self):
+        # Only what a task can leave behind in its mapset: MASK and region
+        self.env.pop('GRASS_REGION', None)
+        if gs.find_file('MASK', element='cell', mapset=self.mapset, env=self.env)['file']:
+            gs.run_command('r.mask', flags='r', quiet=True, env=self.env)
+        gs.run_command('g.region', flags='d', env=self.env)
+
+    def is_healthy(self):
+        if self.env is None:
+            return False
+        try:
+            env = gs.parse_command('g.gisenv', flags='n', env=self.env)
+            return env.get('MAPSET') == self.mapset and env.get('LOCATION_NAME') == self.location
+        except Exception:
+            return False
+
+    def close(self):
+        if self.gisrc and os.path.exists(self.gisrc):
+            os.remove(self.gisrc)
+        self.gisrc = self.env = None
+
+
+class GrassSessionPool:
+    """Fixed number of GRASS sessions with checkout/return.
+
+    with pool.session() as session:
+        zonal_report(geojson_file, selectedYear, zone_cache_dir, env=session.env)
+    """
+
+    def __init__(self, gisdb, location, size=2, mapset_prefix="eqipa_stats", search_path=()):
+        # GISBASE and the GRASS python paths must be set up once per process
+        if 'GISBASE' not in os.environ:
+            gsetup.init(gisdb, location, 'PERMANENT')
+
+        self.size = size
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self.sessions = []
+        for i in range(size):
+            session = GrassSession(gisdb, location, f"{mapset_prefix}_{i}", search_path)
+            session.start()
+            self.sessions.append(session)
+            self._idle.put(session)
+
+    def checkout(self, timeout=None):
+        session = self._idle.get(timeout=timeout)
+        if session.is_healthy():
+            return session
+
+        logger.warning("Restarting GRASS session %s", session.mapset)
+        try:
+            session.close()
+            session.start()
+        except Exception:
+            # The slot stays in the pool and is rebuilt by the next checkout;
+            # the error goes to the caller
+            session.close()
+            self._idle.put(session)
+            raise
+        return session
+
+    def checkin(self, session):
+        try:
+            session.reset()
+        except Exception:
+            # Closed here, rebuilt by the next checkout; the task's own
+            # result or error is not replaced by this one
+            logger.exception("Reset of GRASS session %s failed", session.mapset)
+            session.close()
+        finally:
+            session.tasks += 1
+            self._idle.put(session)
+
+    @contextmanager
+    def session(self, timeout=None):
+        session = self.checkout(timeout=timeout)
+        try:
+            yield session
+        finally:
+            self.checkin(session)
+
+    def health(self):
+        # {mapset: healthy} of the idle sessions; busy ones are not touched
+        with self._lock:
+            idle = []
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            status = {session.mapset: session.is_healthy() for session in idle}
+            for session in idle:
+                self._idle.put(session)
+        return status
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
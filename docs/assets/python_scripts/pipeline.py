@@ -0,0 +1,179 @@
+import os
+import time
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from grass_io import raster_mtime
+from grass_parallel import default_workers
+
+
+# Dependency-aware runner for the processing chain.
+#
+# Every task declares the rasters (and files) it reads and writes. A task
+# depends on the tasks that write its inputs, which gives a DAG; tasks whose
+# dependencies are done run concurrently in a thread pool, so independent
+# branches (ETa, TBP, PCP) run side by side.
+#
+# A task is run only when it is stale:
+#   - an output is missing, or
+#   - an input is newer than the oldest output, or
+#   - one of its dependencies was run in this pipeline run.
+# Fresh tasks are skipped, so after adding one month only the tasks that
+# read that month (and their descendants) are run again. When a task fails
+# or an input is missing, its descendants are not run.
+
+
+@dataclass
+class Task:
+    name: str
+    func: object
+    kwargs: dict = field(default_factory=dict)
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    input_files: list = field(default_factory=list)
+    output_files: list = field(default_factory=list)
+    env: dict = None
+
+
+def _key(name):
+    # Rasters are matched by name, with or without @mapset
+    return name.split('@')[0]
+
+
+def _file_mtime(path):
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+
+def task_state(task):
+    """'fresh', 'stale' or 'missing input' from the input and output times."""
+    input_times = ([raster_mtime(name, env=task.env) for name in task.inputs]
+                   + [_file_mtime(path) for path in task.input_files])
+    if any(t is None for t in input_times):
+        return "missing input"
+
+    output_times = ([raster_mtime(name, env=task.env) for name in task.outputs]
+                    + [_file_mtime(path) for path in task.output_files])
+    if not output_times or any(t is None for t in output_times):
+        return "stale"
+    if max(input_times, default=0) > min(output_times):
+        return "stale"
+    return "fresh"
+
+
+def dependencies(tasks):
+    """{task name: names of the tasks that write its inputs}."""
+    producers = {}
+    for task in tasks:
+        for output in [_key(name) for name in task.outputs] + task.output_files:
+            if output in producers:
+                raise ValueError(f"{output} is written by {producers[output]} and {task.name}")
+            producers[output] = task.name
+
+    deps = {}
+    for task in tasks:
+        inputs = [_key(name) for name in task.inputs] + task.input_files
+        deps[task.name] = {producers[i] for i in inputs if i in producers} - {task.name}
+
+    # Kahn's algorithm: every task must be reachable without a cycle
+    remaining = {name: set(d) for name, d in deps.items()}
+    ready = [name for name, d in remaining.items() if not d]
+    seen = 0
+    while ready:
+        name = ready.pop()
+        seen += 1
+        for other, d in remaining.items():
+            if name in d:
+                d.discard(name)
+                if not d:
+                    ready.append(other)
+    if seen != len(tasks):
+        raise ValueError("The tasks contain a dependency cycle")
+    return deps
+
+
+def _run_task(task, upstream_ran, force, dry_run):
+    if force or upstream_ran:
+        state = "stale"
+    else:
+        state = task_state(task)
+
+    if state != "stale":
+        return state, 0.0
+    if dry_run:
+        return "would run", 0.0
+
+    start = time.perf_counter()
+    task.func(**task.kwargs)
+    return "ran", time.perf_counter() - start
+
+
+def run_pipeline(tasks, workers=None, force=False, dry_run=False):
+    """Run the stale tasks in dependency order.
+
+    Returns {task name: status}, the status being one of 'fresh', 'ran',
+    'would run' (dry_run), 'missing input', 'failed' or 'blocked' (an
+    upstream task failed or had a missing input). Raises after all runnable
+    tasks have finished if a task failed.
+    """
+    workers = workers or default_workers()
+    by_name = {task.name: task for task in tasks}
+    if len(by_name) != len(tasks):
+        raise ValueError("Task names must be unique")
+
+    deps = dependencies(tasks)
+    dependents = {name: [] for name in by_name}
+    for name, d in deps.items():
+        for parent in d:
+            dependents[parent].append(name)
+
+    remaining = {name: set(d) for name, d in deps.items()}
+    status = {}
+    errors = []
+
+    def block(name):
+        for child in dependents[name]:
+            if child not in status:
+                status[child] = "blocked"
+                block(child)
+
+    ready = [name for name, d in remaining.items() if not d]
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while ready or running:
+            for name in ready:
+                upstream_ran = any(status[parent] in ("ran", "would run") for parent in deps[name])
+                future = pool.submit(_run_task, by_name[name], upstream_ran, force, dry_run)
+                running[future] = name
+            ready = []
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    status[name], seconds = future.result()
+                    if status[name] == "ran":
+                        print(f"{name} done in {seconds:.1f}s")
+                except Exception as e:
+                    print(f"{name} failed: {e}")
+                    status[name] = "failed"
+                    errors.append(e)
+
+                if status[name] in ("failed", "missing input"):
+                    block(name)
+                    continue
+                for child in dependents[name]:
+                    remaining[child].discard(name)
+                    if not remaining[child] and child not in status:
+                        ready.append(child)
+
+    counts = {}
+    for state in status.values():
+        counts[state] = counts.get(state, 0) + 1
+    print("Pipeline: " + ", ".join(f"{n} {state}" for state, n in sorted(counts.items())))
+    for name, state in status.items():
+        if state in ("missing input", "blocked"):
+            print(f"  {name}: {state}")
+
+    if errors:
+        raise errors[0]
+    return status
@@ -0,0 +1,142 @@
+import grass.script as gs
+
+from grass_io import raster_mtime
+from grass_parallel import temp_name, publish
+
+
+# Prefix-sum (cumulative) raster stacks for month-window aggregation.
+#
+# For a monthly series m_1 ... m_N two cumulative stacks are kept:
+#   {base}_cum_YYYY_MM = sum of all months up to and including YYYY_MM
+#   {base}_cnt_YYYY_MM = number of non-null months up to YYYY_MM
+# Null months count as 0 in the sum. Any contiguous window (crop year,
+# season, calendar year) is then
+#   cum[end] - cum[start - 1]
+# and is null where cnt[end] - cnt[start - 1] == 0, which gives the same
+# result as r.series method=sum over the window's monthly maps.
+#
+# The stacks are only valid for the region they were built in; build and
+# query them with the same region (e.g. the same GRASS_REGION env). The
+# first month of the stack (its origin) is recorded in the description of
+# every cumulative map; maps accumulated from another origin are rebuilt.
+
+
+# Month windows as (first month, last month), wrapping over the year end
+CROP_YEAR = (6, 5)
+CALENDAR_YEAR = (1, 12)
+SEASONS = {
+    'kharif': (6, 10),
+    'rabi': (11, 3),
+    'zaid': (4, 5),
+}
+
+
+def month_range(start, end):
+    """(year, month) tuples from start to end inclusive."""
+    months = []
+    year, month = start
+    while (year, month) <= end:
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def window_months(year, window):
+    # A window like (6, 5) starting in `year` ends in May of year + 1
+    first, last = window
+    end_year = year + 1 if last < first else year
+    return (year, first), (end_year, last)
+
+
+def crop_year_window(year, window, crop_year=CROP_YEAR):
+    # Months of a window inside the crop year starting in `year`: with a
+    # June-May crop year, Zaid (Apr-May) of 2023_2024 is April-May 2024
+    first, _ = window
+    start_year = year if first >= crop_year[0] else year + 1
+    return window_months(start_year, window)
+
+
+def _name(prefix, year, month):
+    return f"{prefix}_{year}_{month:02d}"
+
+
+def _origin_description(monthly_prefix, start):
+    return f"prefix sum of {_name(monthly_prefix, *start)} onwards"
+
+
+def _has_origin(name, description, env=None):
+    recorded = gs.raster_info(name, env=env).get('description') or ''
+    return recorded.strip('"') == description
+
+
+def build_prefix_sums(monthly_prefix, base, start, end, env=None):
+    """Create or update the cumulative stacks for months start..end.
+
+    A month is rebuilt when its cumulative map is missing, older than the
+    monthly map or accumulated from another first month; every month after
+    it is then rebuilt as well. Sum and count are written by one r.mapcalc
+    call, so each month is read once.
+    """
+    months = month_range(start, end)
+    description = _origin_description(monthly_prefix, start)
+    stale = False
+    built = 0
+
+    for i, (year, month) in enumerate(months):
+        monthly_map = _name(monthly_prefix, year, month)
+        monthly_time = raster_mtime(monthly_map, env=env)
+        if monthly_time is None:
+            raise RuntimeError(f"{monthly_map} not found; the stack needs every month "
+                               f"from {_name(monthly_prefix, *start)} to {_name(monthly_prefix, *end)}")
+        cum_map = _name(f"{base}_cum", year, month)
+        cnt_map = _name(f"{base}_cnt", year, month)
+
+        cum_time = raster_mtime(cum_map, env=env)
+        if (not stale and cum_time is not None
+                and cum_time >= monthly_time
+                and _has_origin(cum_map, description, env=env)):
+            continue
+        stale = True
+
+        tmp_cum, tmp_cnt = temp_name(cum_map), temp_name(cnt_map)
+        value = f"if(isnull({monthly_map}), 0, double({monthly_map}))"
+        valid = f"if(isnull({monthly_map}), 0, 1)"
+        if i == 0:
+            expression = f"{tmp_cum} = {value}\n{tmp_cnt} = {valid}"
+        else:
+            prev_cum = _name(f"{base}_cum", *months[i - 1])
+            prev_cnt = _name(f"{base}_cnt", *months[i - 1])
+            expression = (f"{tmp_cum} = {prev_cum} + {value}\n"
+                          f"{tmp_cnt} = {prev_cnt} + {valid}")
+
+        gs.mapcalc(expression, overwrite=True, quiet=True, env=env)
+        for tmp_map in (tmp_cum, tmp_cnt):
+            gs.run_command('r.support', map=tmp_map, description=description, env=env)
+        publish(tmp_cum, cum_map, env=env)
+        publish(tmp_cnt, cnt_map, env=env)
+        built += 1
+
+    print(f"{base}: {built} cumulative month(s) built, {len(months) - built} up to date")
+
+
+def window_sum(base, start, end, output, stack_start, env=None):
+    """Sum of months start..end from the cumulative stacks of `base`.
+
+    stack_start is the first month of the stack, as passed to
+    build_prefix_sums; windows starting there need no subtraction.
+    """
+    cum_end = _name(f"{base}_cum", *end)
+    cnt_end = _name(f"{base}_cnt", *end)
+
+    if start == stack_start:
+        expression = f"if({cnt_end} == 0, null(), {cum_end})"
+    else:
+        before = month_range(stack_start, start)[-2]
+        cum_before = _name(f"{base}_cum", *before)
+        cnt_before = _name(f"{base}_cnt", *before)
+        expression = (f"if({cnt_end} - {cnt_before} == 0, null(), "
+                      f"{cum_end} - {cum_before})")
+
+    tmp_output = temp_name(output)
+    gs.mapcalc(f"{tmp_output} = {expression}", overwrite=True, quiet=True, env=env)
+    publish(tmp_output, output, env=env)
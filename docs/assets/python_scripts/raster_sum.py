@@ -0,0 +1,55 @@
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+
+# Memory-bounded, NaN-aware sum of rasters on the same grid.
+#
+# Instead of np.stack + np.nansum over all files, the output is processed in
+# windows of `block_rows` rows. For each window the inputs are read one at a
+# time into a running float32 sum and a valid-pixel count, so peak memory is
+# a few arrays of block_rows x width, independent of the number of files.
+#
+# Same result as the stack version: no-data (the first file's nodata value,
+# -9999 if it has none) and NaN are ignored, and pixels without any valid
+# value are set to nodata_val.
+
+
+def sum_rasters(input_files, output_file, block_rows=512):
+    with rasterio.open(input_files[0]) as first:
+        meta = first.meta.copy()
+        nodata_val = first.nodata
+        if nodata_val is None:
+            # If nodata isn't defined, set a default value (e.g., -9999)
+            nodata_val = -9999
+        width, height = first.width, first.height
+
+    meta.update(dtype=rasterio.float32, count=1, nodata=nodata_val)
+
+    sources = [rasterio.open(path) for path in input_files]
+    try:
+        for src in sources:
+            if (src.width, src.height) != (width, height) or src.transform != sources[0].transform:
+                raise ValueError(f"{src.name} is not on the same grid as {input_files[0]}")
+
+        with rasterio.open(output_file, 'w', **meta) as dst:
+            for row_off in range(0, height, block_rows):
+                window = Window(0, row_off, width, min(block_rows, height - row_off))
+
+                total = np.zeros((window.height, width), dtype=np.float32)
+                valid_count = np.zeros((window.height, width), dtype=np.uint16)
+
+                for src in sources:
+                    data = src.read(1, window=window).astype(np.float32)
+                    valid = (data != nodata_val) & ~np.isnan(data)
+                    total[valid] += data[valid]
+                    valid_count += valid
+
+                # Pixels that are no-data in all input files
+                total[valid_count == 0] = nodata_val
+                dst.write(total, 1, window=window)
+    finally:
+        for src in sources:
+            src.close()
+
+    return output_file
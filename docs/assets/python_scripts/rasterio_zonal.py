@@ -0,0 +1,352 @@
+import tempfile
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+from pyproj import Geod
+from rasterio.crs import CRS
+from rasterio.features import rasterize
+from rasterio.windows import Window
+from affine import Affine
+
+from zonal_engine import run_zonal_pass, ZonalPass
+from zone_geometry import zones_bounds, region_from_bounds, region_transform
+from window_plan import WindowPlan, zone_boxes, merge_windows
+from eqipa_indicators import eqipa_layers, eqipa_indicators
+
+
+# Zonal statistics without GRASS.
+#
+# Same engine as grass_io.zonal_statistics (zonal_engine.run_zonal_pass), but
+# the zone grid is rasterized with rasterio and the rasters are GeoTIFFs read
+# block by block with rasterio. Every raster is resampled on the fly to the
+# zone grid with nearest neighbour: a zone grid cell takes the value of the
+# source cell containing its centre, which is what GRASS does for maps read
+# in a region of another resolution. The results therefore match the GRASS
+# scripts within float tolerance. Only the source windows under the zones
+# are read (window_plan.py), aligned to the tiles of the file. Rasters must be in the CRS of the zones
+# (EPSG:4326 for all EQIPA data). No GRASS session is needed, which makes it
+# usable from Celery workers.
+
+
+def zone_attributes(zones):
+    # Attribute table like v.db.select after v.to.db option=area
+    geod = Geod(ellps="WGS84")
+    attributes = pd.DataFrame(zones.drop(columns="geometry"))
+    attributes.insert(0, "cat", np.arange(1, len(zones) + 1))
+    attributes["geographical_area_ha"] = [
+        abs(geod.geometry_area_perimeter(geom)[0]) / 10000 if geom is not None else np.nan
+        for geom in zones.to_crs("EPSG:4326").geometry
+    ]
+    return attributes
+
+
+class RasterioZoneGrid:
+    """Zone-id grid of a GeoJSON at resolution res (cat = feature order, from 1).
+
+    The labels are rasterized one block of block_rows rows at a time into a
+    memmap on a temporary file (deleted with the grid), so a large grid at
+    a fine resolution is not held in RAM, like the memmap of zone_cache.py.
+    """
+
+    def __init__(self, geojson_file, res, block_rows=1024):
+        zones = gpd.read_file(geojson_file)
+        self.region = region_from_bounds(zones_bounds(zones), res)
+        self.transform = region_transform(self.region)
+        self.shape = (self.region["rows"], self.region["cols"])
+
+        cats = np.arange(1, len(zones) + 1)
+        self.n_zones = len(zones)
+        self.crs = zones.crs or "EPSG:4326"
+        # Cell box of every zone, for the window plans of the rasters and
+        # the row blocks below
+        self.boxes = zone_boxes(zones.geometry.bounds.values, self.transform, self.shape)
+
+        shapes = [((geom, int(cat)), box) for cat, geom, box in zip(cats, zones.geometry, self.boxes)
+                  if geom is not None and box is not None]
+        self._file = tempfile.TemporaryFile()
+        self.labels = np.memmap(self._file, dtype=np.int32, mode="w+", shape=self.shape)
+        rows, cols = self.shape
+        for start in range(0, rows, block_rows):
+            n = min(block_rows, rows - start)
+            block_shapes = [shape for shape, box in shapes if box[0] < start + n and box[1] > start]
+            if block_shapes:
+                self.labels[start:start + n] = rasterize(
+                    block_shapes, out_shape=(n, cols), fill=0, dtype="int32",
+                    transform=self.transform * Affine.translation(0, start)
+                )
+        self.labels.flush()
+
+        self.attributes = zone_attributes(zones)
+
+
+def _cell_index(offset, res, n, src_offset, src_res):
+    # Source cell containing the centre of each of n target cells (one axis)
+    centres = offset + (np.arange(n) + 0.5) * res
+    return np.floor((centres - src_offset) / src_res).astype(np.int64)
+
+
+def _check_crs(src, path, zone_grid):
+    if src.crs and CRS.from_user_input(zone_grid.crs) != src.crs:
+        src.close()
+        raise ValueError(f"{path} is not in the CRS of the zones ({zone_grid.crs})")
+
+
+def _grid_index(src, zone_grid):
+    # Source row of every zone grid row and source col of every zone grid col
+    t, s = zone_grid.transform, src.transform
+    rows = _cell_index(t.f, t.e, zone_grid.shape[0], s.f, s.e)
+    cols = _cell_index(t.c, t.a, zone_grid.shape[1], s.c, s.a)
+    return rows, cols
+
+
+def _window_plan(src, zone_grid, rows, cols):
+    block_shape = src.block_shapes[0]
+    if block_shape[1] >= src.width:
+        # Strips: whole rows are decoded anyway, only the rows are aligned
+        block_shape = (block_shape[0], 1)
+    return WindowPlan(zone_grid.boxes, rows, cols, (src.height, src.width), block_shape)
+
+
+class _TileCache:
+    """Tiles of one raster, kept while later row blocks may need them.
+
+    Planned windows are assembled from the internal tiles of the file (for
+    striped files, 256-column pieces of a strip); a tile is read once, even
+    when the windows of consecutive blocks or bands overlap it (e.g. the
+    coarse IMD cells under every zone block), so pixels_read counts every
+    pixel fetched from the file.
+    """
+
+    def __init__(self, src):
+        self.src = src
+        bh, bw = src.block_shapes[0]
+        self.tile_shape = (bh, bw if bw < src.width else min(256, src.width))
+        self.tiles = {}
+        self.pixels_read = 0
+
+    def _tile(self, tile_row, tile_col):
+        tile = self.tiles.get((tile_row, tile_col))
+        if tile is None:
+            bh, bw = self.tile_shape
+            r0, c0 = tile_row * bh, tile_col * bw
+            window = Window(c0, r0, min(bw, self.src.width - c0), min(bh, self.src.height - r0))
+            data = self.src.read(1, window=window, masked=True)
+            tile = data.astype(np.float32).filled(np.nan)
+            self.pixels_read += tile.size
+            self.tiles[(tile_row, tile_col)] = tile
+        return tile
+
+    def read(self, windows, first_row):
+        """[(window, data)] of the windows; rows above first_row are not needed any more."""
+        bh, bw = self.tile_shape
+        self.tiles = {key: tile for key, tile in self.tiles.items() if (key[0] + 1) * bh > first_row}
+        result = []
+        for r0, r1, c0, c1 in windows:
+            out = np.empty((r1 - r0, c1 - c0), dtype=np.float32)
+            for tile_row in range(r0 // bh, -(-r1 // bh)):
+                for tile_col in range(c0 // bw, -(-c1 // bw)):
+                    tile = self._tile(tile_row, tile_col)
+                    tr0, tc0 = tile_row * bh, tile_col * bw
+                    rr0, rr1 = max(r0, tr0), min(r1, tr0 + tile.shape[0])
+                    cc0, cc1 = max(c0, tc0), min(c1, tc0 + tile.shape[1])
+                    out[rr0 - r0:rr1 - r0, cc0 - c0:cc1 - c0] = tile[rr0 - tr0:rr1 - tr0, cc0 - tc0:cc1 - tc0]
+            result.append(((r0, r1, c0, c1), out))
+        return result
+
+
+def _fill(out, rows, cols, window_data):
+    # Cells whose source cell lies in a window; the others stay NaN (they are
+    # outside every zone)
+    for (r0, r1, c0, c1), data in window_data:
+        row_in = (rows >= r0) & (rows < r1)
+        col_in = (cols >= c0) & (cols < c1)
+        if row_in.any() and col_in.any():
+            out[np.ix_(row_in, col_in)] = data[np.ix_(rows[row_in] - r0, cols[col_in] - c0)]
+
+
+class _GridReader:
+    """Reads a raster resampled (nearest) to the zone grid, one row block at a time."""
+
+    def __init__(self, path, zone_grid):
+        self.src = rasterio.open(path)
+        _check_crs(self.src, path, zone_grid)
+        self.rows, self.cols = _grid_index(self.src, zone_grid)
+        self.plan = _window_plan(self.src, zone_grid, self.rows, self.cols)
+        self.cache = _TileCache(self.src)
+
+    @property
+    def pixels_read(self):
+        return self.cache.pixels_read
+
+    def read(self, start, n):
+        # Only the planned windows of the zones in this block are read
+        out = np.full((n, self.cols.size), np.nan, dtype=np.float32)
+        window_data = self.cache.read(self.plan.windows(start, start + n), int(self.rows[start]))
+        _fill(out, self.rows[start:start + n], self.cols, window_data)
+        return out
+
+    def close(self):
+        self.src.close()
+
+
+def read_blocks(sources, zone_grid, derived=None, block_rows=256):
+    """Yield dicts of row blocks on the zone grid, reading each file once.
+
+    sources maps raster name -> GeoTIFF path. derived maps extra names to a
+    function of the block (e.g. BWP from TBP and ETa). No-data and cells
+    outside a raster are NaN.
+    """
+    rows = zone_grid.shape[0]
+    readers = {}
+    try:
+        for name, path in sources.items():
+            readers[name] = _GridReader(path, zone_grid)
+
+        for start in range(0, rows, block_rows):
+            n = min(block_rows, rows - start)
+            block = {"zones": zone_grid.labels[start:start + n]}
+            for name, reader in readers.items():
+                block[name] = reader.read(start, n)
+            for name, func in (derived or {}).items():
+                block[name] = func(block)
+            yield block
+
+        for name, reader in readers.items():
+            print(f"{name}: read {reader.pixels_read} of {reader.src.width * reader.src.height} pixels")
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+
+def zonal_statistics(zone_grid, layers, sources, derived=None, block_rows=256):
+    """Run all layers over the zone grid in a single pass per input file."""
+    blocks = read_blocks(sources, zone_grid, derived=derived, block_rows=block_rows)
+    return run_zonal_pass(blocks, layers, zone_grid.n_zones)
+
+
+def bwp(block):
+    # BWP = TBP / (ETa * 10); division by zero gives null, like r.mapcalc
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = block["tbp"] / (block["eta"] * 10)
+    result[~np.isfinite(result)] = np.nan
+    return result
+
+
+def batch_zonal_statistics(zone_grids, layers, sources, derived=None, block_rows=256):
+    """One pass over the rasters for several zone grids (e.g. queued requests).
+
+    Every zone grid keeps its own cells, so the result of each grid is the
+    same as zonal_statistics(zone_grid, ...) on its own. The grids are swept
+    together from north to south in bands of block_rows * res; per band and
+    raster, the planned windows of all grids (window_plan.py) are merged and
+    read once. Zones of all grids are accumulated
+    in one ZonalPass with consecutive ids, so overlapping zones of different
+    requests are counted independently.
+
+    Returns [(stats_df, crosstab matrices)] per zone grid, cat from 1 for
+    every grid and the matrices in the order of the ZonalCrosstab layers.
+    """
+    offsets = np.cumsum([0] + [grid.n_zones for grid in zone_grids])
+    zonal_pass = ZonalPass(layers, int(offsets[-1]))
+
+    # Band of every zone grid row, from the latitude of the row centres
+    top = max(grid.transform.f for grid in zone_grids)
+    band_height = block_rows * min(-grid.transform.e for grid in zone_grids)
+    row_bands = []
+    for grid in zone_grids:
+        centres = grid.transform.f + (np.arange(grid.shape[0]) + 0.5) * grid.transform.e
+        row_bands.append(np.floor((top - centres) / band_height).astype(np.int64))
+    n_bands = max(int(bands[-1]) + 1 for bands in row_bands)
+
+    srcs, index, plans, caches = {}, {}, {}, {}
+    try:
+        for name, path in sources.items():
+            srcs[name] = rasterio.open(path)
+            caches[name] = _TileCache(srcs[name])
+            for grid in zone_grids:
+                _check_crs(srcs[name], path, grid)
+            index[name] = [_grid_index(srcs[name], grid) for grid in zone_grids]
+            plans[name] = [_window_plan(srcs[name], grid, *grid_index)
+                           for grid, grid_index in zip(zone_grids, index[name])]
+
+        for band in range(n_bands):
+            # Zone grid rows of every grid in this band
+            spans = {}
+            for i, bands in enumerate(row_bands):
+                start, end = np.searchsorted(bands, [band, band + 1])
+                if end > start:
+                    spans[i] = (int(start), int(end))
+            if not spans:
+                continue
+
+            blocks = {i: {} for i in spans}
+            for name in srcs:
+                # The planned windows of all grids in the band, merged, are
+                # read once and shared (also with later bands)
+                windows = merge_windows([w for i, (start, end) in spans.items()
+                                         for w in plans[name][i].windows(start, end)])
+                first_row = min(int(index[name][i][0][start]) for i, (start, end) in spans.items())
+                window_data = caches[name].read(windows, first_row)
+                for i, (start, end) in spans.items():
+                    rows, cols = index[name][i]
+                    out = np.full((end - start, cols.size), np.nan, dtype=np.float32)
+                    _fill(out, rows[start:end], cols, window_data)
+                    blocks[i][name] = out
+
+            for i, (start, end) in spans.items():
+                block = blocks[i]
+                labels = zone_grids[i].labels[start:end]
+                block["zones"] = np.where(labels > 0, labels + offsets[i], 0)
+                for name, func in (derived or {}).items():
+                    block[name] = func(block)
+                zonal_pass.add(block)
+
+        for name, src in srcs.items():
+            print(f"{name}: read {caches[name].pixels_read} of {src.width * src.height} pixels")
+    finally:
+        for src in srcs.values():
+            src.close()
+
+    df = zonal_pass.result()
+    results = []
+    for grid, offset in zip(zone_grids, offsets):
+        cats = np.arange(1, grid.n_zones + 1)
+        stats_df = df.iloc[offset:offset + grid.n_zones].reset_index(drop=True)
+        stats_df["cat"] = cats
+        matrices = []
+        for crosstab in zonal_pass.crosstabs:
+            matrix = crosstab.matrix.iloc[offset:offset + grid.n_zones].copy()
+            matrix.index = pd.Index(cats, name="cat")
+            matrices.append(matrix)
+        results.append((stats_df, matrices))
+    return results
+
+
+def eqipa_zonal_stats(geojson_file, year, lcc, eta, tbp, pcp, res=0.001, zone_grid=None):
+    """EQIPA overview Stats table for one crop year from GeoTIFF files.
+
+    lcc, eta, tbp and pcp are the paths of the LULC, annual ETa, annual TBP
+    and annual PCP rasters. Returns the same columns as 6_eqipa_zonalStats.py
+    (before rounding).
+    """
+    zone_grid = zone_grid or RasterioZoneGrid(geojson_file, res)
+    sources = {"lcc": lcc, "eta": eta, "tbp": tbp, "pcp": pcp}
+
+    layers, class_counts = eqipa_layers(year, "lcc", "eta", "tbp", "pcp", "bwp")
+    stats_df = zonal_statistics(zone_grid, layers + [class_counts], sources, derived={"bwp": bwp})
+    return eqipa_indicators(zone_grid.attributes, stats_df, class_counts.matrix, year)
+
+
+def eqipa_batch_zonal_stats(geojson_files, year, lcc, eta, tbp, pcp, res=0.001, zone_grids=None):
+    """eqipa_zonal_stats for several GeoJSONs with one pass over the rasters.
+
+    Returns one Stats table per GeoJSON, in the same order.
+    """
+    zone_grids = zone_grids or [RasterioZoneGrid(geojson_file, res) for geojson_file in geojson_files]
+    sources = {"lcc": lcc, "eta": eta, "tbp": tbp, "pcp": pcp}
+
+    layers, class_counts = eqipa_layers(year, "lcc", "eta", "tbp", "pcp", "bwp")
+    results = batch_zonal_statistics(zone_grids, layers + [class_counts], sources, derived={"bwp": bwp})
+    return [eqipa_indicators(grid.attributes, stats_df, matrices[0], year)
+            for grid, (stats_df, matrices) in zip(zone_grids, results)]
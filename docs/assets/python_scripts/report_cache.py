@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager, suppress
+
+
+# Content-addressed cache of finished reports.
+#
+# The key is the SHA-256 of
+#   - the normalized GeoJSON (features' geometry and properties, key order,
+#     whitespace and coordinate noise below `precision` decimals removed),
+#   - the report year (selectedYear),
+#   - the stamps of the source rasters (grass_io.raster_stamps).
+# A reimported or recomputed raster gets a new stamp, so old results are
+# never returned; they are dropped when a new result for the same geometry
+# and year is stored, or evicted later. The DataFrames of a report are
+# pickled to one file per entry; an SQLite index keeps size and last use for
+# LRU eviction (max_entries, max_bytes).
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    key TEXT PRIMARY KEY,
+    geometry_hash TEXT NOT NULL,
+    year TEXT NOT NULL,
+    stamps TEXT NOT NULL,
+    file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+"""
+
+
+def _round_coordinates(coords, precision):
+    if isinstance(coords, (int, float)):
+        return round(coords, precision)
+    return [_round_coordinates(c, precision) for c in coords]
+
+
+def _normalize_geometry(geometry, precision):
+    if geometry is None:
+        return None
+    if geometry.get("type") == "GeometryCollection":
+        return {"type": "GeometryCollection",
+                "geometries": [_normalize_geometry(g, precision) for g in geometry["geometries"]]}
+    return {"type": geometry["type"],
+            "coordinates": _round_coordinates(geometry["coordinates"], precision)}
+
+
+def geojson_hash(geojson_file, precision=7):
+    """Hash of the GeoJSON content, independent of formatting and key order."""
+    with open(geojson_file) as f:
+        data = json.load(f)
+
+    features = data["features"] if data.get("type") == "FeatureCollection" else [data]
+    normalized = []
+    for feature in features:
+        geometry = feature.get("geometry") if feature.get("type") == "Feature" else feature
+        normalized.append({
+            "geometry": _normalize_geometry(geometry, precision),
+            "properties": feature.get("properties") or {},
+        })
+
+    text = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ReportCache:
+    """Can be shared by the threads of a worker; close() it, or use it as a context manager."""
+
+    def __init__(self, cache_dir, max_entries=1000, max_bytes=1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "index.sqlite")
+        # One connection, used by one thread at a time
+        self._con = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._connect() as con:
+            con.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One transaction (commit or rollback) under the lock
+        with self._lock, self._con as con:
+            yield con
+
+    def close(self):
+        with self._lock:
+            self._con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def key(geometry_hash, year, stamps):
+        text = json.dumps([geometry_hash, str(year), stamps], sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key):
+        """The cached {name: DataFrame} of key, or None."""
+        with self._connect() as con:
+            row = con.execute("SELECT file FROM reports WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            path = os.path.join(self.cache_dir, row[0])
+            con.execute("UPDATE reports SET last_used=? WHERE key=?", (time.time(), key))
+
+        # Read outside the lock; the file may have been evicted or replaced
+        # by another thread or process since, which counts as a miss
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except (EOFError, pickle.UnpicklingError):
+            with suppress(FileNotFoundError):
+                os.remove(path)
+        with self._connect() as con:
+            # Unless a put of the same key has written the file again meanwhile
+            if not os.path.exists(path):
+                con.execute("DELETE FROM reports WHERE key=?", (key,))
+        return None
+
+    def put(self, key, geometry_hash, year, stamps, frames):
+        """Store {name: DataFrame} under key and drop outdated entries."""
+        file_name = f"{key}.pkl"
+        path = os.path.join(self.cache_dir, file_name)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(frames, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._connect() as con:
+            # Results for the same geometry and year with other raster stamps
+            # are outdated
+            outdated = con.execute(
+                "SELECT key, file FROM reports WHERE geometry_hash=? AND year=? AND key<>?",
+                (geometry_hash, str(year), key)
+            ).fetchall()
+            self._delete(con, outdated)
+            con.execute(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, geometry_hash, str(year), json.dumps(stamps, sort_keys=True),
+                 file_name, os.path.getsize(path), now, now)
+            )
+            self._evict(con)
+
+    def invalidate(self, geometry_hash=None, year=None):
+        """Drop entries of a geometry and/or year (all entries without arguments)."""
+        query, params = "SELECT key, file FROM reports WHERE 1=1", []
+        if geometry_hash is not None:
+            query += " AND geometry_hash=?"
+            params.append(geometry_hash)
+        if year is not None:
+            query += " AND year=?"
+            params.append(str(year))
+        with self._connect() as con:
+            self._delete(con, con.execute(query, params).fetchall())
+
+    def _delete(self, con, rows):
+        for key, file_name in rows:
+            con.execute("DELETE FROM reports WHERE key=?", (key,))
+            path = os.path.join(self.cache_dir, file_name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _evict(self, con):
+        # Least recently used first, until both limits are met
+        rows = con.execute("SELECT key, file, size FROM reports ORDER BY last_used DESC").fetchall()
+        total, keep = 0, 0
+        for key, file_name, size in rows:
+            if keep >= self.max_entries or total + size > self.max_bytes:
+                break
+            total += size
+            keep += 1
+        self._delete(con, [(key, file_name) for key, file_name, size in rows[keep:]])
@@ -0,0 +1,115 @@
+import sqlite3
+import pandas as pd
+
+
+# Long-format store of zonal statistics:
+#   zonal_stats(zone_key, zone, variable, year, month, stat, value)
+#   sources(zone_key, variable, year, month, raster, stamp)
+#
+# zone_key identifies the zone grid (see zone_cache.py) and stamp is the
+# raster_stamp() of the source raster when the stats were computed. A month
+# only has to be recomputed when it is missing or its stamp has changed.
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS zonal_stats (
+    zone_key TEXT NOT NULL,
+    zone INTEGER NOT NULL,
+    variable TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    stat TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (zone_key, variable, year, month, stat, zone)
+);
+CREATE TABLE IF NOT EXISTS sources (
+    zone_key TEXT NOT NULL,
+    variable TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    raster TEXT NOT NULL,
+    stamp TEXT NOT NULL,
+    PRIMARY KEY (zone_key, variable, year, month)
+);
+"""
+
+
+class ZonalStatsStore:
+    """One SQLite connection; close() it, or use the store as a context manager."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._con = sqlite3.connect(db_path)
+        with self._con as con:
+            con.executescript(SCHEMA)
+
+    def close(self):
+        self._con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_fresh(self, zone_key, variable, year, month, stamp):
+        with self._con as con:
+            row = con.execute(
+                "SELECT stamp FROM sources WHERE zone_key=? AND variable=? AND year=? AND month=?",
+                (zone_key, variable, year, month)
+            ).fetchone()
+        return row is not None and row[0] == stamp
+
+    def write(self, zone_key, variable, year, month, raster, stamp, stats):
+        """Replace the stats of one (variable, year, month).
+
+        stats is a DataFrame with a "cat" column and one column per statistic.
+        """
+        long_df = stats.melt(id_vars="cat", var_name="stat", value_name="value")
+        rows = [
+            (zone_key, int(cat), variable, year, month, stat, None if pd.isna(value) else float(value))
+            for cat, stat, value in long_df[["cat", "stat", "value"]].itertuples(index=False)
+        ]
+
+        # Stats and source stamp are replaced in one transaction
+        with self._con as con:
+            con.execute(
+                "DELETE FROM zonal_stats WHERE zone_key=? AND variable=? AND year=? AND month=?",
+                (zone_key, variable, year, month)
+            )
+            con.executemany("INSERT INTO zonal_stats VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            con.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?)",
+                (zone_key, variable, year, month, raster, stamp)
+            )
+
+    def read(self, zone_key, variable=None, start=None, end=None):
+        """Long table of the stored stats; start and end are (year, month), inclusive."""
+        query = ("SELECT s.zone, s.variable, s.year, s.month, s.stat, s.value, src.raster "
+                 "FROM zonal_stats s JOIN sources src USING (zone_key, variable, year, month) "
+                 "WHERE s.zone_key=?")
+        params = [zone_key]
+        if variable:
+            query += " AND s.variable=?"
+            params.append(variable)
+        if start:
+            query += " AND s.year * 12 + s.month >= ?"
+            params.append(start[0] * 12 + start[1])
+        if end:
+            query += " AND s.year * 12 + s.month <= ?"
+            params.append(end[0] * 12 + end[1])
+        with self._con as con:
+            return pd.read_sql_query(query + " ORDER BY s.year, s.month, s.zone", con, params=params)
+
+    def wide(self, zone_key, variable=None, start=None, end=None):
+        """One row per zone, one column f"{raster}_{stat}" per month and statistic.
+
+        Only months from start to end ((year, month), inclusive) are included.
+        """
+        long_df = self.read(zone_key, variable, start, end)
+        long_df["column"] = long_df["raster"] + "_" + long_df["stat"]
+        columns = list(dict.fromkeys(long_df["column"]))
+        wide_df = long_df.pivot(index="zone", columns="column", values="value")[columns]
+        wide_df.index.name = "cat"
+        wide_df.columns.name = None
+        return wide_df.reset_index()
@@ -0,0 +1,133 @@
+import os
+import re
+import datetime
+import subprocess
+import tempfile
+import grass.script as gs
+
+from prefix_sums import window_months
+
+
+# Monthly and crop-year maps as GRASS space-time raster datasets (STRDS).
+#
+# Every series (e.g. wapor_eta_m_YYYY_MM) is registered in an STRDS of the
+# mapset that holds its maps, with the time interval parsed from the name:
+#   {prefix}_YYYY_MM     -> [YYYY-MM-01, first day of the next month)
+#   {prefix}_YYYY_YYYY+1 -> crop year [YYYY-06-01, YYYY+1-06-01)
+# Scripts then look maps up by time through the STRDS index (t.rast.list
+# with a where clause) instead of formatting names month by month, and see
+# directly which time steps are registered and which are missing.
+# Registration is done from one process at a time (the temporal database
+# of a mapset is a single SQLite file).
+
+
+MONTHLY_SERIES = {
+    "imd_pcp_m": "imd_pcp_monthly",
+    "imd_pcp_resamp_m": "imd_pcp_resamp_monthly",
+    "wapor_eta_m": "wapor_eta_monthly",
+    "wapor_tbp_m": "wapor_tbp_monthly",
+}
+
+CROP_YEAR_SERIES = {
+    "imd_pcp_resamp_a": "imd_pcp_resamp_crop_year",
+    "wapor_eta_a": "wapor_eta_crop_year",
+    "wapor_tbp_a": "wapor_tbp_crop_year",
+}
+
+
+def add_months(date, n):
+    month = date.month - 1 + n
+    return datetime.date(date.year + month // 12, month % 12 + 1, 1)
+
+
+def window_interval(year, window):
+    """[start, end) dates of a month window like (6, 5) starting in year."""
+    (start_year, start_month), (end_year, end_month) = window_months(year, window)
+    return datetime.date(start_year, start_month, 1), add_months(datetime.date(end_year, end_month, 1), 1)
+
+
+def map_interval(name, prefix, crop_year_start=6):
+    """Time interval of a map from its name, or None if it is not a time step."""
+    suffix = name[len(prefix):]
+    match = re.fullmatch(r"_(\d{4})_(\d{2})", suffix)
+    if match:
+        start = datetime.date(int(match.group(1)), int(match.group(2)), 1)
+        return start, add_months(start, 1)
+    match = re.fullmatch(r"_(\d{4})_(\d{4})", suffix)
+    if match and int(match.group(2)) == int(match.group(1)) + 1:
+        start = datetime.date(int(match.group(1)), crop_year_start, 1)
+        return start, add_months(start, 12)
+    return None
+
+
+def _date(text):
+    text = text.strip()
+    if not text or text == "None":
+        return None
+    return datetime.datetime.fromisoformat(text).date()
+
+
+def strds_exists(strds, env=None):
+    return gs.run_command('t.info', input=strds, flags='g', errors='status', quiet=True,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env) == 0
+
+
+def ensure_strds(strds, title, env=None):
+    # Values of a time step are sums over its interval (mm/month, kg/ha/month)
+    if not strds_exists(strds, env=env):
+        gs.run_command('t.create', output=strds, type='strds', temporaltype='absolute',
+                       semantictype='sum', title=title, description=title, quiet=True, env=env)
+
+
+def time_index(strds, where=None, env=None):
+    """[(start, end, map name@mapset)] of the registered maps, by start time.
+
+    where is a temporal SQL condition, e.g.
+    "start_time >= '2023-06-01' AND end_time <= '2024-06-01'".
+    """
+    kwargs = {'where': where} if where else {}
+    text = gs.read_command('t.rast.list', input=strds, columns='name,mapset,start_time,end_time',
+                           flags='u', separator='|', order='start_time', env=env, **kwargs)
+    index = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        name, mapset, start, end = line.split('|')
+        index.append((_date(start), _date(end), f"{name}@{mapset}"))
+    return index
+
+
+def maps_in_range(index, start, end):
+    """Names of the maps of a time_index within [start, end)."""
+    return [name for map_start, map_end, name in index
+            if map_start >= start and map_end is not None and map_end <= end]
+
+
+def register_series(prefix, strds, crop_year_start=6, env=None):
+    """Register the maps {prefix}_* of the current mapset that are not in strds yet.
+
+    Returns the number of newly registered maps.
+    """
+    ensure_strds(strds, f"{prefix} time series", env=env)
+    mapset = gs.gisenv(env=env)['MAPSET']
+    registered = {name for _, _, name in time_index(strds, env=env)}
+
+    lines = []
+    for full_name in gs.list_strings('raster', pattern=f"{prefix}_*", mapset=mapset, env=env):
+        if full_name in registered:
+            continue
+        interval = map_interval(full_name.split('@')[0], prefix, crop_year_start)
+        if interval is not None:
+            lines.append(f"{full_name}|{interval[0]}|{interval[1]}")
+
+    if lines:
+        # One t.register call for all new maps
+        fd, path = tempfile.mkstemp(suffix=".txt")
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        try:
+            gs.run_command('t.register', input=strds, type='raster', file=path, quiet=True, env=env)
+        finally:
+            os.remove(path)
+    print(f"{strds}: {len(lines)} map(s) registered, {len(registered)} already in the index")
+    return len(lines)
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+# Source windows to read for a zone grid.
+#
+# Every zone (feature) has a box of zone grid cells from its bounds. For a
+# row block of the zone grid, the boxes of the zones in that block are
+# mapped to each source raster through the cell index of the zone grid
+# (source row/col containing each cell centre), widened to the internal
+# blocks (tiles or strips) of the source file, and overlapping windows are
+# merged. Only these windows are read, so a small command area costs the
+# tiles under it, not the national raster; tiles shared by neighbouring
+# zones are read once. Windows are (row_start, row_end, col_start, col_end).
+
+
+def zone_boxes(bounds, transform, shape):
+    """Zone grid cell box of every zone from its (minx, miny, maxx, maxy) bounds.
+
+    A box holds every cell whose centre can lie in the zone, i.e. every cell
+    rasterize() may label; None for zones without geometry.
+    """
+    inverse = ~transform
+    boxes = []
+    for minx, miny, maxx, maxy in bounds:
+        if not np.isfinite([minx, miny, maxx, maxy]).all():
+            boxes.append(None)
+            continue
+        col0, row0 = inverse * (minx, maxy)
+        col1, row1 = inverse * (maxx, miny)
+        r0, r1 = max(int(np.floor(min(row0, row1))), 0), min(int(np.ceil(max(row0, row1))), shape[0])
+        c0, c1 = max(int(np.floor(min(col0, col1))), 0), min(int(np.ceil(max(col0, col1))), shape[1])
+        boxes.append((r0, r1, c0, c1) if r1 > r0 and c1 > c0 else None)
+    return boxes
+
+
+def align(window, block_shape, src_shape):
+    # Widen to whole internal blocks of the source file
+    r0, r1, c0, c1 = window
+    bh, bw = block_shape
+    return (r0 // bh * bh, min(-(-r1 // bh) * bh, src_shape[0]),
+            c0 // bw * bw, min(-(-c1 // bw) * bw, src_shape[1]))
+
+
+def merge_windows(windows):
+    """Merge overlapping windows until they are disjoint."""
+    merged = list(windows)
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        for w in merged:
+            for i, m in enumerate(result):
+                if w[0] < m[1] and m[0] < w[1] and w[2] < m[3] and m[2] < w[3]:
+                    result[i] = (min(w[0], m[0]), max(w[1], m[1]), min(w[2], m[2]), max(w[3], m[3]))
+                    changed = True
+                    break
+            else:
+                result.append(w)
+        merged = result
+    return sorted(merged)
+
+
+class WindowPlan:
+    """Source windows of one zone grid on one source raster, per row block."""
+
+    def __init__(self, boxes, rows, cols, src_shape, block_shape):
+        # rows/cols: source row/col of every zone grid row/col (may be outside)
+        self.boxes = [box for box in boxes if box is not None]
+        self.rows = rows
+        self.cols = cols
+        self.src_shape = src_shape
+        self.block_shape = block_shape
+
+    def windows(self, start, end):
+        """Merged, block-aligned source windows for zone grid rows start..end."""
+        windows = []
+        for r0, r1, c0, c1 in self.boxes:
+            r0, r1 = max(r0, start), min(r1, end)
+            if r1 <= r0:
+                continue
+            rows = self.rows[r0:r1]
+            cols = self.cols[c0:c1]
+            rows = rows[(rows >= 0) & (rows < self.src_shape[0])]
+            cols = cols[(cols >= 0) & (cols < self.src_shape[1])]
+            if rows.size and cols.size:
+                window = (int(rows.min()), int(rows.max()) + 1, int(cols.min()), int(cols.max()) + 1)
+                windows.append(align(window, self.block_shape, self.src_shape))
+        return merge_windows(windows)
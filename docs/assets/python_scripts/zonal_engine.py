@@ -0,0 +1,253 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+
+
+# Zonal statistics engine
+#
+# The zones are given as an integer label grid (0 = outside every zone) and the
+# rasters are fed in as row blocks on the same grid. Every statistic is
+# accumulated per zone with np.bincount, so one pass over the blocks gives
+# count, sum, mean, stddev, coeff_var and percentiles for all zones together.
+# The engine only needs numpy/pandas; reading the blocks (GRASS, rasterio) is
+# done by the caller.
+
+
+METHODS = ("number", "sum", "average", "stddev", "variance", "coeff_var", "percentile")
+
+
+@dataclass
+class ZonalLayer:
+    # Output columns are named f"{prefix}_{method}", like v.rast.stats does
+    prefix: str
+    raster: str
+    methods: list
+    # Only count cells where mask_raster is one of mask_cats (replaces r.mask)
+    mask_raster: str = None
+    mask_cats: tuple = ()
+    percentile: float = 98
+    # None: exact percentile (keeps every value, like r.univar).
+    # A number: per-zone histogram with bins of 2 * percentile_error, so the
+    # percentile is off by at most percentile_error (exact for data already
+    # on that grid) and memory per zone is bounded by the value range.
+    percentile_error: float = None
+
+    def rasters(self):
+        names = [self.raster]
+        if self.mask_raster:
+            names.append(self.mask_raster)
+        return names
+
+
+@dataclass
+class ZonalCrosstab:
+    # Pixel count of every (zone, class) pair of a categorical raster.
+    # classes maps class value -> column name; run_zonal_pass fills matrix
+    # with one row per zone (index "cat") and one column per class.
+    raster: str
+    classes: dict
+    matrix: pd.DataFrame = field(default=None, repr=False)
+
+    def rasters(self):
+        return [self.raster]
+
+
+class ClassCounts:
+    """Running (zone, class) pixel counts, one bincount per block."""
+
+    def __init__(self, n_zones, class_values):
+        self.n_zones = n_zones
+        self.values = np.sort(np.asarray(list(class_values), dtype=np.float64))
+        self.counts = np.zeros((n_zones + 1) * len(self.values), dtype=np.int64)
+
+    def add(self, zones, classes):
+        k = len(self.values)
+        idx = np.clip(np.searchsorted(self.values, classes), 0, k - 1)
+        ok = (zones > 0) & (self.values[idx] == classes)
+        self.counts += np.bincount(
+            zones[ok].astype(np.int64) * k + idx[ok], minlength=self.counts.size
+        )
+
+    def result(self):
+        return self.counts.reshape(self.n_zones + 1, len(self.values))
+
+
+def _percentile_rank(count, percentile):
+    # Same rank rule as r.univar, which v.rast.stats uses (0-based)
+    pos = (count * percentile / 100.0 - 0.5).astype(np.int64)
+    return np.clip(pos, 0, np.maximum(count - 1, 0))
+
+
+class ZonalHistogram:
+    """Sparse per-zone histogram for streaming percentiles.
+
+    Values are rounded to multiples of bin_width and only the occupied
+    (zone, bin) pairs are kept, as sorted int64 keys with their counts.
+    """
+
+    def __init__(self, bin_width):
+        self.bin_width = bin_width
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def add(self, zones, values):
+        bins = np.round(values / self.bin_width).astype(np.int64)
+        keys = (zones.astype(np.int64) << 32) + (bins + (1 << 31))
+        keys, counts = np.unique(keys, return_counts=True)
+
+        keys = np.concatenate([self.keys, keys])
+        counts = np.concatenate([self.counts, counts])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.int64)
+
+    def percentile_values(self, count, percentile):
+        result = np.full(count.size, np.nan)
+        has = count > 0
+        if not has.any():
+            return result
+
+        zone_ids = np.nonzero(has)[0]
+        cum = np.cumsum(self.counts)
+        starts = np.searchsorted(self.keys, zone_ids.astype(np.int64) << 32)
+        before = np.where(starts > 0, cum[starts - 1], 0)
+        target = before + _percentile_rank(count[has], percentile)
+        idx = np.searchsorted(cum, target, side="right")
+
+        bins = (self.keys[idx] & 0xFFFFFFFF) - (1 << 31)
+        result[has] = bins * self.bin_width
+        return result
+
+
+class ZonalStats:
+    """Running per-zone count, sum and sum of squares of one layer."""
+
+    def __init__(self, n_zones, percentile=None, percentile_error=None):
+        self.n_zones = n_zones
+        self.percentile = percentile
+        self.count = np.zeros(n_zones + 1, dtype=np.int64)
+        self.sum = np.zeros(n_zones + 1, dtype=np.float64)
+        self.sumsq = np.zeros(n_zones + 1, dtype=np.float64)
+        self._chunks = []
+        self._histogram = None
+        if percentile is not None and percentile_error:
+            self._histogram = ZonalHistogram(2 * percentile_error)
+
+    def add(self, zones, values, valid=None):
+        ok = (zones > 0) & np.isfinite(values)
+        if valid is not None:
+            ok &= valid
+        z = zones[ok]
+        v = values[ok].astype(np.float64)
+        n = self.n_zones + 1
+
+        self.count += np.bincount(z, minlength=n)
+        self.sum += np.bincount(z, weights=v, minlength=n)
+        self.sumsq += np.bincount(z, weights=v * v, minlength=n)
+
+        if self._histogram is not None:
+            self._histogram.add(z, v)
+        elif self.percentile is not None:
+            self._chunks.append((z, v.astype(np.float32)))
+
+    def percentile_values(self):
+        if self._histogram is not None:
+            return self._histogram.percentile_values(self.count, self.percentile)
+
+        result = np.full(self.n_zones + 1, np.nan)
+        if not self._chunks:
+            return result
+
+        z = np.concatenate([c[0] for c in self._chunks])
+        v = np.concatenate([c[1] for c in self._chunks])
+        order = np.lexsort((v, z))
+        v = v[order]
+
+        starts = np.concatenate([[0], np.cumsum(self.count)[:-1]])
+        has = self.count > 0
+        pos = _percentile_rank(self.count, self.percentile)
+        result[has] = v[starts[has] + pos[has]]
+        return result
+
+    def result(self, methods):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.sum / self.count
+            variance = np.maximum(self.sumsq / self.count - mean * mean, 0)
+            stddev = np.sqrt(variance)
+            # r.univar reports the coefficient of variation in percent
+            coeff_var = 100 * stddev / mean
+
+        columns = {}
+        for method in methods:
+            if method == "number":
+                columns["number"] = self.count
+            elif method == "sum":
+                columns["sum"] = np.where(self.count > 0, self.sum, np.nan)
+            elif method == "average":
+                columns["average"] = mean
+            elif method == "stddev":
+                columns["stddev"] = stddev
+            elif method == "variance":
+                columns["variance"] = variance
+            elif method == "coeff_var":
+                columns["coeff_var"] = coeff_var
+            elif method == "percentile":
+                columns[f"percentile_{self.percentile:g}"] = self.percentile_values()
+            else:
+                raise ValueError(f"Unknown zonal method '{method}', use one of {METHODS}")
+        return columns
+
+
+class ZonalPass:
+    """Per-zone accumulators of all layers, fed one row block at a time.
+
+    Each block is a dict with the zone labels under "zones" and one array per
+    raster name used by the layers.
+    """
+
+    def __init__(self, layers, n_zones):
+        self.n_zones = n_zones
+        self.crosstabs = [layer for layer in layers if isinstance(layer, ZonalCrosstab)]
+        self.layers = [layer for layer in layers if not isinstance(layer, ZonalCrosstab)]
+        self.accumulators = [
+            ZonalStats(n_zones,
+                       layer.percentile if "percentile" in layer.methods else None,
+                       layer.percentile_error)
+            for layer in self.layers
+        ]
+        self.class_counts = [ClassCounts(n_zones, crosstab.classes) for crosstab in self.crosstabs]
+
+    def add(self, block):
+        zones = block["zones"]
+        for crosstab, counts in zip(self.crosstabs, self.class_counts):
+            counts.add(zones, block[crosstab.raster])
+        for layer, acc in zip(self.layers, self.accumulators):
+            valid = None
+            if layer.mask_raster:
+                valid = np.isin(block[layer.mask_raster], layer.mask_cats)
+            acc.add(zones, block[layer.raster], valid)
+
+    def result(self):
+        df = pd.DataFrame({"cat": np.arange(1, self.n_zones + 1)})
+        for layer, acc in zip(self.layers, self.accumulators):
+            for method, values in acc.result(layer.methods).items():
+                df[f"{layer.prefix}_{method}"] = values[1:]
+
+        for crosstab, counts in zip(self.crosstabs, self.class_counts):
+            names = [crosstab.classes[key] for key in sorted(crosstab.classes)]
+            crosstab.matrix = pd.DataFrame(counts.result()[1:], columns=names,
+                                           index=pd.Index(df["cat"], name="cat"))
+        return df
+
+
+def run_zonal_pass(blocks, layers, n_zones):
+    """Accumulate all layers over an iterator of row blocks in one pass.
+
+    Each block is a dict with the zone labels under "zones" and one array per
+    raster name used by the layers. Returns a DataFrame with one row per zone
+    id (column "cat") and the f"{prefix}_{method}" columns; ZonalCrosstab
+    layers get their zone x class matrix filled in place.
+    """
+    zonal_pass = ZonalPass(layers, n_zones)
+    for block in blocks:
+        zonal_pass.add(block)
+    return zonal_pass.result()
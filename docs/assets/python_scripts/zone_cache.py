@@ -0,0 +1,125 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+import grass.script as gs
+
+from grass_io import rasterize_zones, read_attributes, read_blocks
+from zone_geometry import geojson_bounds, file_hash, region_from_bounds
+
+
+# Persistent cache of rasterized zone grids.
+#
+# An entry is keyed by the SHA-256 of the GeoJSON file plus the region extent
+# and resolution, and stores:
+#   zones.int32      zone-id grid (cat values, 0 = no zone), read as np.memmap
+#   meta.json        region (n, s, e, w, rows, cols) and number of zones
+#   attributes.csv   attribute table of the imported vector (incl. area)
+#
+# On a cache hit the region is set from meta.json and no v.import / v.to.rast
+# is needed at all.
+
+
+class ZoneGrid:
+    def __init__(self, path, meta, attributes):
+        self.path = path
+        self.key = os.path.basename(path)
+        self.meta = meta
+        self.region = meta["region"]
+        self.n_zones = meta["n_zones"]
+        self.attributes = attributes
+        self.labels = np.memmap(
+            os.path.join(path, "zones.int32"), dtype=np.int32, mode="r",
+            shape=(self.region["rows"], self.region["cols"])
+        )
+
+    def set_region(self, env=None):
+        r = self.region
+        gs.run_command('g.region', n=r["n"], s=r["s"], e=r["e"], w=r["w"],
+                       rows=r["rows"], cols=r["cols"], env=env)
+
+
+class ZoneGridCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, geojson_file, res, env=None):
+        # Extent in the CRS of the location, where v.import puts the vector
+        crs = gs.read_command('g.proj', flags='w', env=env).strip()
+        region = region_from_bounds(geojson_bounds(geojson_file, crs), res)
+        h = hashlib.sha256(file_hash(geojson_file).encode())
+        h.update(json.dumps(region, sort_keys=True).encode())
+        h.update(repr(float(res)).encode())
+        return h.hexdigest()[:32], region
+
+    def get(self, geojson_file, res, env=None):
+        key, _ = self.key(geojson_file, res, env=env)
+        path = os.path.join(self.cache_dir, key)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        attributes = pd.read_csv(os.path.join(path, "attributes.csv"))
+        return ZoneGrid(path, meta, attributes)
+
+    def build(self, geojson_file, vector_name, res, env=None):
+        key, region = self.key(geojson_file, res, env=env)
+        path = os.path.join(self.cache_dir, key)
+        tmp_path = f"{path}.tmp{os.getpid()}_{threading.get_ident()}"
+        os.makedirs(tmp_path, exist_ok=True)
+
+        try:
+            gs.run_command('v.import', input=geojson_file, output=vector_name, overwrite=True, env=env)
+            gs.run_command('v.to.db', map=vector_name, option="area", columns="geographical_area_ha",
+                           units="hectares", overwrite=True, env=env)
+            gs.run_command('g.region', n=region["n"], s=region["s"], e=region["e"], w=region["w"],
+                           rows=region["rows"], cols=region["cols"], env=env)
+
+            zones_map = rasterize_zones(vector_name, env=env)
+            attributes = read_attributes(vector_name, env=env)
+            n_zones = int(attributes["cat"].max())
+
+            labels = np.memmap(os.path.join(tmp_path, "zones.int32"), dtype=np.int32, mode="w+",
+                               shape=(region["rows"], region["cols"]))
+            row = 0
+            for block in read_blocks([], zone_map=zones_map, env=env):
+                n = block["zones"].shape[0]
+                labels[row:row + n] = block["zones"]
+                row += n
+            labels.flush()
+            del labels
+
+            attributes.to_csv(os.path.join(tmp_path, "attributes.csv"), index=False)
+            meta = {"geojson": os.path.basename(geojson_file), "res": res,
+                    "region": region, "n_zones": n_zones}
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+
+            # Publish the entry in one step so readers never see half a grid
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
+
+        return self.get(geojson_file, res, env=env)
+
+
+def load_zone_grid(geojson_file, vector_name, res, cache_dir, env=None):
+    """Return the cached zone grid for the GeoJSON and set the region to it."""
+    cache = ZoneGridCache(cache_dir)
+    zone_grid = cache.get(geojson_file, res, env=env)
+    if zone_grid is None:
+        print(f"Zone grid cache miss: rasterizing {geojson_file}")
+        zone_grid = cache.build(geojson_file, vector_name, res, env=env)
+        print(f"GeoJSON file '{geojson_file}' imported as vector: {vector_name}")
+    else:
+        print(f"Zone grid cache hit: {zone_grid.path}")
+    zone_grid.set_region(env=env)
+    return zone_grid
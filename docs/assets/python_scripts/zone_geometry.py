@@ -0,0 +1,42 @@
+import hashlib
+import geopandas as gpd
+from rasterio.transform import from_bounds
+
+
+# GeoJSON extent and zone grid geometry, shared by the GRASS zone cache and
+# the GRASS-free (rasterio) zonal statistics. No GRASS imports here.
+
+
+def zones_bounds(zones, crs=None):
+    # Extent of a GeoDataFrame as a region dict, reprojected to crs if given
+    # (GeoJSON without a CRS is EPSG:4326)
+    if crs is not None:
+        zones = (zones if zones.crs else zones.set_crs("EPSG:4326")).to_crs(crs)
+    w, s, e, n = zones.total_bounds
+    return {"n": float(n), "s": float(s), "e": float(e), "w": float(w)}
+
+
+def geojson_bounds(geojson_file, crs=None):
+    return zones_bounds(gpd.read_file(geojson_file), crs)
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def region_from_bounds(bounds, res):
+    # Same extent as g.region(vector=..., res=res): bounds are kept and the
+    # resolution is adjusted to a whole number of rows/cols
+    rows = max(int(round((bounds["n"] - bounds["s"]) / res)), 1)
+    cols = max(int(round((bounds["e"] - bounds["w"]) / res)), 1)
+    return dict(bounds, rows=rows, cols=cols)
+
+
+def region_transform(region):
+    # Affine transform of a region dict (n, s, e, w, rows, cols)
+    return from_bounds(region["w"], region["s"], region["e"], region["n"],
+                       region["cols"], region["rows"])
@@ -16,250 +16,43 @@ import re
 import numpy as np
 import geopandas as gdf
 import pandas as pd
+from contextlib import ExitStack
 
-
-
-def main(gisdb, location, mapset):
-
-    geojson_file = f"{vector_name}_{selectedYear}_zonalstats.xlsx"
-    selectedYear="2022_23"
-
-
-    vector_name = sanitize_vector_name(os.path.splitext(geojson_file.name)[0])
-    output_excel_path=f"{vector_name}_{selectedYear}_zonalstats.xlsx"
-
-
-    os.environ['GISDBASE'] = gisdb
-    os.environ['LOCATION_NAME'] = location
-    
-    # Check if mapset exists; if not, create it
-    mapset_path = os.path.join(gisdb, location, mapset)
-    if not os.path.exists(mapset_path):
-        print(f"Mapset '{mapset}' does not exist. Creating new mapset...")
-        # Create the new mapset
-        gs.run_command('g.mapset', flags='c', mapset=mapset, location=location, dbase=gisdb)
-    else:
-        print(f"Mapset '{mapset}' already exists.")
-    
-    # Initialize GRASS session
-    gsetup.init(gisdb, location, mapset)
-    print(f"GRASS GIS session initialized in {gisdb}/{location}/{mapset}")
-
-
-    print("selected_year",selectedYear)
-
-
-
-    v.import_(input=geojson_file, output=vector_name, overwrite=True)
-    g.mapsets(mapset="nrsc_lulc,ind_annual_data", operation="add")
-
-
-    grass.run_command(
-        "v.to.db",
-        map=vector_name,
-        option="area",
-        columns="geographical_area_ha",
-        units="hectares",
-        overwrite=True
-    )
-
-
-    # Set the region to match the raster
-    # g.region(vector=vector_name, res=0.001)
-    g.region(vector=vector_name, res=0.001)
-    # 0.003 degrees ≈ 111 km * 0.003 ≈ 333 meters.
-    # 0.001 degrees ≈ 111 km * 0.001 ≈ 111 meters.
-
-    # LULC: 56m
-    # WaPOR ETa: 300m
-    # WaPOR TBP: 300m
-    # IMD PCP: 0.25 degree
-
-
-    lcc_map=f"LULC_250k_{selectedYear}"
-    eta_map=f"wapor3_eta_a_{selectedYear}"
-    tbp_map=f"wapor3_tbp_a_{selectedYear}"
-    pcp_map=f"imd_pcp_resamp_a_{selectedYear}"
-    bwp_map =f"wapor3_bwp_a_{selectedYear}"
-
-
-    grass.parse_command(
-            'v.rast.stats',
-            map=vector_name,
-            raster=eta_map,
-            method=['average'],
-            column_prefix=f'ETa_{selectedYear}',
-            overwrite=True
-        )
-    
-    grass.parse_command(
-            'v.rast.stats',
-            map=vector_name,
-            raster=pcp_map,
-            method=['average'],
-            column_prefix=f'PCP_{selectedYear}',
-            overwrite=True
-        )
-    
-
-    r.mask(raster=lcc_map, maskcats='2 3 4 5 7')
-
-    grass.mapcalc(f"{bwp_map} = {tbp_map} / ({eta_map} * 10)",overwrite=True)
-    
-
-    grass.parse_command(
-        'v.rast.stats',
-        map=vector_name,
-        raster=eta_map,
-        method=["average","coeff_var" ],
-        column_prefix=f'ETa_cropland_{selectedYear}',
-        overwrite=True
-    )
-    grass.parse_command(
-            "v.rast.stats",
-            map=vector_name,
-            raster=eta_map,
-            column_prefix=f'ETa_cropland_{selectedYear}',
-            method="percentile",
-            percentile=98,
-            overwrite=True,
-        )
-    
-
-    grass.parse_command(
-            "v.rast.stats",
-            map=vector_name,
-            raster=tbp_map,
-            column_prefix=f'BLP_{selectedYear}',
-            method=[ "average"],
-            overwrite=True,
-        )
-
-    grass.parse_command(
-        "v.rast.stats",
-        map=vector_name,
-        raster=bwp_map,
-        column_prefix=f'BWP_{selectedYear}',
-        method=[ "average"],
-        overwrite=True,
-    )
-
-
-
-    r.mask(flags="r")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "python_scripts"))
+from eqipa_indicators import eqipa_layers, eqipa_indicators, multi_year_layers, multi_year_indicators
+from cropland_maps import report_cropland_maps
+from grass_io import zonal_statistics, raster_stamps
+from zone_cache import load_zone_grid
+from report_cache import ReportCache, geojson_hash
 
 
 
+def sanitize_vector_name(file_name):
 
-    cropland_classes = {
-            'exclusive_kharif': '2',
-            'exclusive_rabi': '3',
-            'exclusive_zaid': '4',
-            'double_crop': '5',
-            'plantation': '7'
-    }
+    # Replace invalid characters with underscores
+    vector_name = re.sub(r'[^a-zA-Z0-9_]', '_', file_name)
 
-    # Iterate over each class and perform zonal statistics
-    for class_name, maskcats in cropland_classes.items():
-        # Apply mask
-        r.mask(raster=lcc_map, maskcats=maskcats)
+    # Ensure the name starts with a letter
+    if not vector_name[0].isalpha():
+        vector_name = "v_" + vector_name  # Prefix with "v_"
 
-        grass.parse_command(
-            "v.rast.stats",
-            map=vector_name,
-            raster=lcc_map,
-            column_prefix=f"{class_name}_pixelcount",
-            method=["number"],
-            overwrite=True,
-        )
-        
+    # Truncate if too long (max 256 chars)
+    vector_name = vector_name[:256]
 
-        # Remove mask
-        r.mask(flags="r")
+    return vector_name
 
 
+def write_report(info_df, df, output_excel_path):
     output_csv_path = output_excel_path.replace(".xlsx", ".csv")
-
-    v.out_ogr(
-        input=vector_name,
-        output=output_csv_path,
-        format="CSV",
-        overwrite=True
-    )
-
-
-    
-    g.region(flags="d")  
-
-
-    df = pd.read_csv(output_csv_path)
-    df = df.drop_duplicates()  
-    df.drop(columns=['cat'], inplace=True, errors='ignore')
-
-
-    coeff_var_col = f"ETa_cropland_{selectedYear}_coeff_var"
-    avg_col = f"ETa_cropland_{selectedYear}_average"
-    perc_98_col = f"ETa_cropland_{selectedYear}_percentile_98"
-    equity_col = f"Equity"
-    adequacy_col = f"Adequacy"
-
-
-
-    # Calculate Equity and Adequacy
-    if (
-        coeff_var_col in df.columns and 
-        avg_col in df.columns and 
-        perc_98_col in df.columns and 
-        (df[coeff_var_col] != 0).any() and 
-        (df[avg_col] != 0).any() and 
-        (df[perc_98_col] != 0).any()
-    ):
-        df[equity_col] = 100 - df[coeff_var_col]
-        df[adequacy_col] = (df[avg_col] * 100) / df[perc_98_col]
-    else:
-        print(f"Columns missing for class {class_name}. Skipping Equity and Adequacy calculations.")
-
-    df.drop(columns=[ perc_98_col], errors='ignore', inplace=True)
-
-    
-
-    for class_name in cropland_classes.keys():
-        pixel_count_col = f"{class_name}_pixelcount_number"
-        area_col = f"{class_name}_area_ha"  
-        # Calculate area in hectares for the class
-        if pixel_count_col in df.columns:
-            # df[area_col] = df[pixel_count_col] * 3020 / 10000  
-            df[area_col] = df[pixel_count_col] * 2978 / 10000  
-            df.drop(columns=[pixel_count_col], errors='ignore', inplace=True)
-    
-
-    cropland_area_cols = [f"{class_name}_area_ha" for class_name in cropland_classes.keys()]
-    df["Cropland_Area_ha"] = df[cropland_area_cols].sum(axis=1)  # Sum all class areas
-
-    for col in [f"{class_name}_area_ha" for class_name in cropland_classes.keys()]:
-        if col not in df.columns:
-            df[col] = 0
-        df[col] = df[col].fillna(0)
-
-
-    df["Gross_Cropped_Area_ha"] = (
-        df["exclusive_kharif_area_ha"]
-        + df["exclusive_rabi_area_ha"]
-        + df["exclusive_zaid_area_ha"]
-        + (df["double_crop_area_ha"] * 2)
-        + df["plantation_area_ha"]
-    )
-    df["Cropping_Intensity"] = df["Gross_Cropped_Area_ha"] *100/ df["Cropland_Area_ha"]
-    df["Cropping_Intensity"] = df["Cropping_Intensity"].replace([np.inf, -np.inf, np.nan], 0)
-
-    
-    
-
-    df = df.round(2)
     df.to_csv(output_csv_path, index=False)
 
+    # Write to Excel with two sheets
+    with pd.ExcelWriter(output_excel_path, engine="openpyxl") as writer:
+        info_df.to_excel(writer, sheet_name="Info", index=False)
+        df.to_excel(writer, sheet_name="Stats", index=False)
 
 
+def report_info(selectedYear):
     info_data = {
         "Abbreviation": [
             "ETa_average", 
@@ -337,40 +130,195 @@ def main(gisdb, location, mapset):
         ]
     }
 
-    info_df = pd.DataFrame(info_data)
+    return pd.DataFrame(info_data)
 
-    # Write to Excel with two sheets
-    with pd.ExcelWriter(output_excel_path, engine="openpyxl") as writer:
-        info_df.to_excel(writer, sheet_name="Info", index=False)
-        df.to_excel(writer, sheet_name="Stats", index=False)
 
+def zonal_report(geojson_file, selectedYear, zone_cache_dir, env=None, report_cache=None):
+    """Write the overview report of one GeoJSON and crop year.
 
-    print(f"GeoJSON file '{geojson_file}' imported as vector: {vector_name}")
+    All GRASS calls use env, so the report can run in any initialized
+    session, e.g. a slot of grass_session_pool.GrassSessionPool. The mapsets
+    with the input rasters must be in the session's search path.
 
+    With a report_cache.ReportCache, a report of the same geometry and year
+    whose source rasters have not changed is written from the cache.
+    """
 
+    vector_name = sanitize_vector_name(os.path.splitext(os.path.basename(geojson_file))[0])
+    output_excel_path=f"{vector_name}_{selectedYear}_zonalstats.xlsx"
 
 
+    print("selected_year",selectedYear)
 
-if __name__ == '__main__':
-    GISDBASE = "/Volumes/ExternalSSD/grassdata"
-    LOCATION_NAME = "wagen"
-    MAPSET = "eqipa_stats"  
-             
-    # Call the main function
-    main(GISDBASE, LOCATION_NAME, MAPSET)
 
+    lcc_map=f"LULC_250k_{selectedYear}"
+    eta_map=f"wapor3_eta_a_{selectedYear}"
+    tbp_map=f"wapor3_tbp_a_{selectedYear}"
+    pcp_map=f"imd_pcp_resamp_a_{selectedYear}"
+    bwp_map =f"wapor3_bwp_a_{selectedYear}"
 
 
-def sanitize_vector_name(file_name):
+    if report_cache is not None:
+        # BWP is derived from ETa and TBP, so their stamps cover it
+        geometry_hash = geojson_hash(geojson_file)
+        stamps = raster_stamps([lcc_map, eta_map, tbp_map, pcp_map], env=env)
+        cache_key = report_cache.key(geometry_hash, selectedYear, stamps)
+        frames = report_cache.get(cache_key)
+        if frames is not None:
+            print(f"Report cache hit: {cache_key}")
+            write_report(frames["Info"], frames["Stats"], output_excel_path)
+            return output_excel_path
 
-    # Replace invalid characters with underscores
-    vector_name = re.sub(r'[^a-zA-Z0-9_]', '_', file_name)
 
-    # Ensure the name starts with a letter
-    if not vector_name[0].isalpha():
-        vector_name = "v_" + vector_name  # Prefix with "v_"
+    # Zone grid and attribute table (incl. geographical_area_ha) come from the
+    # cache; only the first run for this GeoJSON imports and rasterizes it.
+    # The region is set to the GeoJSON extent at res=0.001.
+    zone_grid = load_zone_grid(geojson_file, vector_name, res=0.001, cache_dir=zone_cache_dir, env=env)
+    # 0.003 degrees ≈ 111 km * 0.003 ≈ 333 meters.
+    # 0.001 degrees ≈ 111 km * 0.001 ≈ 111 meters.
 
-    # Truncate if too long (max 256 chars)
-    vector_name = vector_name[:256]
+    # LULC: 56m
+    # WaPOR ETa: 300m
+    # WaPOR TBP: 300m
+    # IMD PCP: 0.25 degree
 
-    return vector_name
+
+    # BWP over cropland: a shared map is reused only when it is newer than
+    # ETa, TBP and LULC and covers this region on the same 0.001 grid (not the
+    # 0.00292 map of 4_raster_calculation.py); otherwise it is computed for
+    # this report only (without r.mask)
+    with report_cropland_maps(selectedYear, lcc_map, products=("bwp",), prefix="wapor3", env=env) as maps:
+        bwp_map = maps["bwp"]
+
+        # Read every raster a single time over the cached zone grid; the layers,
+        # cropland mask and class crosstab are defined in eqipa_indicators.py
+        layers, class_counts = eqipa_layers(selectedYear, lcc_map, eta_map, tbp_map, pcp_map, bwp_map)
+        layers.append(class_counts)
+
+        stats_df = zonal_statistics(zone_grid.labels, layers, n_zones=zone_grid.n_zones, env=env)
+
+
+    gs.run_command('g.region', flags="d", env=env)
+
+
+    # Equity, Adequacy and cropland class areas
+    df = eqipa_indicators(zone_grid.attributes, stats_df, class_counts.matrix, selectedYear)
+
+
+    df = df.round(2)
+
+
+
+    info_df = report_info(selectedYear)
+
+    write_report(info_df, df, output_excel_path)
+
+    if report_cache is not None:
+        report_cache.put(cache_key, geometry_hash, selectedYear, stamps, {"Info": info_df, "Stats": df})
+
+
+    return output_excel_path
+
+
+def zonal_report_years(geojson_file, years, zone_cache_dir, env=None, report_cache=None):
+    """Write one overview report for several crop years (batch mode).
+
+    The Stats sheet has one row per (zone, year) and a Year column. The
+    zone grid is loaded once and all years are computed in one zonal pass;
+    years with the same LULC map share its class counts.
+    """
+
+    vector_name = sanitize_vector_name(os.path.splitext(os.path.basename(geojson_file))[0])
+    output_excel_path = f"{vector_name}_{years[0]}-{years[-1]}_zonalstats.xlsx"
+    print("selected_years", years)
+
+    year_maps = {
+        year: (f"LULC_250k_{year}", f"wapor3_eta_a_{year}", f"wapor3_tbp_a_{year}",
+               f"imd_pcp_resamp_a_{year}", f"wapor3_bwp_a_{year}")
+        for year in years
+    }
+    year_label = ", ".join(years)
+
+    if report_cache is not None:
+        geometry_hash = geojson_hash(geojson_file)
+        names = sorted({name for maps in year_maps.values() for name in maps[:4]})
+        stamps = raster_stamps(names, env=env)
+        cache_key = report_cache.key(geometry_hash, year_label, stamps)
+        frames = report_cache.get(cache_key)
+        if frames is not None:
+            print(f"Report cache hit: {cache_key}")
+            write_report(frames["Info"], frames["Stats"], output_excel_path)
+            return output_excel_path
+
+    zone_grid = load_zone_grid(geojson_file, vector_name, res=0.001, cache_dir=zone_cache_dir, env=env)
+
+    # BWP over cropland of every year, reused when fresh on this region's grid
+    with ExitStack() as stack:
+        for year, maps in year_maps.items():
+            bwp = stack.enter_context(report_cropland_maps(year, maps[0], products=("bwp",),
+                                                           prefix="wapor3", env=env))["bwp"]
+            year_maps[year] = maps[:4] + (bwp,)
+
+        # All years in one pass: every raster (and a shared LULC map) is read once
+        layers, class_counts = multi_year_layers(year_maps)
+        stats_df = zonal_statistics(zone_grid.labels, layers, n_zones=zone_grid.n_zones, env=env)
+
+    gs.run_command('g.region', flags="d", env=env)
+
+    df = multi_year_indicators(zone_grid.attributes, stats_df, class_counts, year_maps)
+    df = df.round(2)
+
+    info_df = report_info(year_label)
+    write_report(info_df, df, output_excel_path)
+
+    if report_cache is not None:
+        report_cache.put(cache_key, geometry_hash, year_label, stamps, {"Info": info_df, "Stats": df})
+
+    return output_excel_path
+
+
+def main(gisdb, location, mapset):
+
+    geojson_file = "StatesBoundary.geojson"
+    selectedYear="2022_23"
+    zone_cache_dir = "/Volumes/ExternalSSD/zone_cache"
+    report_cache_dir = "/Volumes/ExternalSSD/report_cache"
+
+
+    os.environ['GISDBASE'] = gisdb
+    os.environ['LOCATION_NAME'] = location
+    
+    # Check if mapset exists; if not, create it
+    mapset_path = os.path.join(gisdb, location, mapset)
+    if not os.path.exists(mapset_path):
+        print(f"Mapset '{mapset}' does not exist. Creating new mapset...")
+        # Create the new mapset
+        gs.run_command('g.mapset', flags='c', mapset=mapset, location=location, dbase=gisdb)
+    else:
+        print(f"Mapset '{mapset}' already exists.")
+    
+    # Initialize GRASS session
+    gsetup.init(gisdb, location, mapset)
+    print(f"GRASS GIS session initialized in {gisdb}/{location}/{mapset}")
+
+
+    g.mapsets(mapset="nrsc_lulc,ind_annual_data", operation="add")
+
+    with ReportCache(report_cache_dir) as report_cache:
+        zonal_report(geojson_file, selectedYear, zone_cache_dir, report_cache=report_cache)
+
+        # Batch mode: one report with a Year column for a range of crop years
+        # zonal_report_years(geojson_file, ["2018_19", "2019_20", "2020_21", "2021_22", "2022_23"],
+        #                    zone_cache_dir, report_cache=report_cache)
+
+
+
+
+
+if __name__ == '__main__':
+    GISDBASE = "/Volumes/ExternalSSD/grassdata"
+    LOCATION_NAME = "wagen"
+    MAPSET = "eqipa_stats"  
+             
+    # Call the main function
+    main(GISDBASE, LOCATION_NAME, MAPSET)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts import their helper modules by plain name
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "docs", "assets", "python_scripts"))
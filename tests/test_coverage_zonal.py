@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+shapely = pytest.importorskip("shapely")
+pytest.importorskip("rasterio")
+from rasterio.transform import from_origin
+
+from coverage_zonal import WeightedStats, coverage_fractions
+
+
+def _brute_fractions(geometry, transform, shape):
+    fractions = np.zeros(shape)
+    for row in range(shape[0]):
+        for col in range(shape[1]):
+            left, top = transform * (col, row)
+            right, bottom = transform * (col + 1, row + 1)
+            cell = shapely.box(left, bottom, right, top)
+            fractions[row, col] = geometry.intersection(cell).area / cell.area
+    return fractions
+
+
+@pytest.mark.parametrize("geometry", [
+    shapely.box(0.25, 0.5, 2.5, 2.75),
+    shapely.Polygon([(0.1, 0.1), (3.7, 0.4), (1.9, 3.8)]),
+    shapely.box(0.3, 0.3, 1.7, 1.7).union(shapely.box(2.2, 2.2, 3.9, 3.6)),
+])
+def test_coverage_fractions_match_cell_intersections(geometry):
+    transform = from_origin(0, 4, 1, 1)
+    fractions = coverage_fractions(geometry, transform, (4, 4))
+
+    np.testing.assert_allclose(fractions, _brute_fractions(geometry, transform, (4, 4)), atol=1e-12)
+    assert fractions.sum() == pytest.approx(geometry.area)
+
+
+def test_weighted_stats_match_brute_force():
+    rng = np.random.default_rng(4)
+    values = rng.random(500) * 100
+    weights = rng.random(500)
+    stats = WeightedStats(1, percentile=98)
+    stats.add(1, values, weights)
+    columns = stats.result(["average", "coeff_var", "percentile"])
+
+    mean = np.average(values, weights=weights)
+    sd = np.sqrt(np.average((values - mean) ** 2, weights=weights))
+    order = np.argsort(values)
+    cum = np.cumsum(weights[order])
+    percentile = values[order][np.searchsorted(cum, cum[-1] * 0.98)]
+
+    assert columns["average"][1] == pytest.approx(mean)
+    assert columns["coeff_var"][1] == pytest.approx(100 * sd / mean)
+    assert columns["percentile_98"][1] == pytest.approx(percentile)
+
+    binned = WeightedStats(1, percentile=98, percentile_error=0.05)
+    binned.add(1, values, weights)
+    assert abs(binned.percentile_values()[1] - percentile) <= 0.05 + 1e-9
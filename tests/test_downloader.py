@@ -0,0 +1,130 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+from downloader import Download, download_all
+
+
+DATA = os.urandom(200_000)
+ETAG = '"v2"'
+
+
+class FileServer:
+    """Serves DATA with Range/If-Range; `failures` is a list of status codes
+    sent (in order) before the file is served."""
+
+    def __init__(self):
+        self.requests = []
+        self.failures = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                byte_range, if_range = self.headers.get("Range"), self.headers.get("If-Range")
+                server.requests.append((byte_range, if_range))
+                if server.failures:
+                    self.send_response(server.failures.pop(0))
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                body, status = DATA, 200
+                if byte_range and if_range == ETAG:
+                    start = int(byte_range.split("=")[1].rstrip("-"))
+                    if start >= len(DATA):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(DATA)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    body, status = DATA[start:], 206
+                self.send_response(status)
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{len(DATA) - 1}/{len(DATA)}")
+                self.send_header("ETag", ETAG)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/file.bin"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def server():
+    server = FileServer()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+def _download(server, folder, part=None, validator=None):
+    path = folder / "file.bin"
+    if part is not None:
+        (folder / "file.bin.part").write_bytes(part)
+    if validator is not None:
+        (folder / "file.bin.part.validator").write_text(validator)
+    done = download_all([Download(server.url, "file.bin")], str(folder), backoff=0)
+    return done, path
+
+
+def test_resume_sends_range_and_if_range(server, tmp_path):
+    done, path = _download(server, tmp_path, DATA[:5000], ETAG)
+
+    assert done == {"file.bin": str(path)}
+    assert path.read_bytes() == DATA
+    assert server.requests == [("bytes=5000-", ETAG)]
+    assert sorted(os.listdir(tmp_path)) == ["download_manifest.json", "file.bin"]
+
+
+def test_changed_validator_downloads_whole_file(server, tmp_path):
+    done, path = _download(server, tmp_path, b"x" * 5000, '"v1"')
+
+    assert path.read_bytes() == DATA
+    assert server.requests == [("bytes=5000-", '"v1"')]
+
+
+def test_part_without_validator_starts_again(server, tmp_path):
+    done, path = _download(server, tmp_path, b"x" * 5000)
+
+    assert path.read_bytes() == DATA
+    assert server.requests == [(None, None)]
+
+
+def test_416_accepts_complete_part(server, tmp_path):
+    done, path = _download(server, tmp_path, DATA, ETAG)
+
+    assert path.read_bytes() == DATA
+    assert len(server.requests) == 1
+
+
+def test_416_discards_oversized_part(server, tmp_path):
+    done, path = _download(server, tmp_path, DATA + b"extra", ETAG)
+
+    assert path.read_bytes() == DATA
+    assert server.requests == [(f"bytes={len(DATA) + 5}-", ETAG), (None, None)]
+
+
+def test_5xx_and_429_are_retried(server, tmp_path):
+    server.failures = [503, 429]
+    done, path = _download(server, tmp_path)
+
+    assert path.read_bytes() == DATA
+    assert len(server.requests) == 3
+
+
+def test_4xx_fails_without_retry(server, tmp_path):
+    server.failures = [404]
+    done, path = _download(server, tmp_path)
+
+    assert done == {}
+    assert not path.exists()
+    assert len(server.requests) == 1
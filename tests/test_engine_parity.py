@@ -0,0 +1,76 @@
+import shutil
+
+import numpy as np
+import pytest
+
+gs = pytest.importorskip("grass.script")
+rasterio = pytest.importorskip("rasterio")
+if shutil.which("grass") is None:
+    pytest.skip("GRASS executable not found", allow_module_level=True)
+import grass.script.setup as gsetup
+from rasterio.transform import from_origin
+
+import grass_io
+import rasterio_zonal
+from test_rasterio_zonal import _write_zones
+from zonal_engine import ZonalCrosstab, ZonalLayer
+from zone_cache import load_zone_grid
+
+
+RES = 0.002
+
+
+@pytest.fixture(scope="module")
+def rasters(tmp_path_factory):
+    # 0.01 degree source rasters over the zones, resampled to the RES zone grid
+    folder = tmp_path_factory.mktemp("rasters")
+    rng = np.random.default_rng(6)
+    profile = dict(driver="GTiff", count=1, width=60, height=50, crs="EPSG:4326",
+                   transform=from_origin(76.9, 20.5, 0.01, 0.01), nodata=-9999)
+    eta = rng.gamma(2.0, 150.0, (50, 60)).astype(np.float32)
+    eta[rng.random((50, 60)) < 0.05] = -9999
+    lcc = rng.integers(1, 8, (50, 60)).astype(np.float32)
+
+    paths = {}
+    for name, data in (("eta", eta), ("lcc", lcc)):
+        paths[name] = str(folder / f"{name}.tif")
+        with rasterio.open(paths[name], "w", dtype="float32", **profile) as dst:
+            dst.write(data, 1)
+    paths["zones"] = _write_zones(folder / "zones.geojson")
+    return paths
+
+
+@pytest.fixture(scope="module")
+def grass_session(tmp_path_factory):
+    dbase = str(tmp_path_factory.mktemp("grassdata"))
+    gs.create_location(dbase, "parity", epsg=4326)
+    gsetup.init(dbase, "parity", "PERMANENT")
+    yield
+    gsetup.finish()
+
+
+def _layers():
+    return [
+        ZonalLayer("eta", "eta", ["number", "average", "coeff_var", "percentile"]),
+        ZonalLayer("eta_crop", "eta", ["average"], mask_raster="lcc", mask_cats=(2, 3, 5)),
+        ZonalCrosstab("lcc", {2: "kharif", 3: "rabi", 5: "double_crop"}),
+    ]
+
+
+def test_grass_and_rasterio_engines_agree(rasters, grass_session, tmp_path):
+    for name in ("eta", "lcc"):
+        gs.run_command("r.in.gdal", input=rasters[name], output=name, overwrite=True, quiet=True)
+    zone_grid = load_zone_grid(rasters["zones"], "zones", RES, str(tmp_path / "zone_cache"))
+    grass_layers = _layers()
+    grass_df = grass_io.zonal_statistics(zone_grid.labels, grass_layers, n_zones=zone_grid.n_zones)
+
+    rasterio_grid = rasterio_zonal.RasterioZoneGrid(rasters["zones"], RES)
+    rasterio_layers = _layers()
+    rasterio_df = rasterio_zonal.zonal_statistics(rasterio_grid, rasterio_layers,
+                                                  {"eta": rasters["eta"], "lcc": rasters["lcc"]})
+
+    np.testing.assert_array_equal(rasterio_grid.labels, zone_grid.labels)
+    columns = [c for c in grass_df.columns if c != "cat"]
+    np.testing.assert_allclose(rasterio_df[columns].to_numpy(float), grass_df[columns].to_numpy(float),
+                               rtol=1e-5, equal_nan=True)
+    assert rasterio_layers[-1].matrix.equals(grass_layers[-1].matrix)
@@ -0,0 +1,102 @@
+import re
+
+import numpy as np
+import pytest
+
+gs = pytest.importorskip("grass.script")
+import prefix_sums
+from prefix_sums import SEASONS, build_prefix_sums, crop_year_window, month_range, window_sum
+
+
+class NumpyMapset:
+    """Raster maps held as numpy arrays, driven through the gs calls prefix_sums uses."""
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.maps = {}
+        self.descriptions = {}
+        self.mtimes = {}
+        self.clock = 0
+
+    def _write(self, name, array):
+        self.clock += 1
+        self.maps[name] = np.broadcast_to(np.asarray(array, dtype=np.float64), self.shape).copy()
+        self.mtimes[name] = self.clock
+
+    def mapcalc(self, expression, **kwargs):
+        namespace = dict(self.maps, _if=lambda c, a, b: np.where(c, a, b),
+                         isnull=np.isnan, double=np.asarray, _null=np.nan)
+        for line in expression.splitlines():
+            name, expr = (part.strip() for part in line.split("=", 1))
+            expr = re.sub(r"\bif\(", "_if(", expr).replace("null()", "_null")
+            self._write(name, eval(expr, {}, namespace))
+
+    def run_command(self, module, **kwargs):
+        if module == 'r.support':
+            self.descriptions[kwargs['map']] = kwargs['description']
+        elif module == 'g.rename':
+            old, new = kwargs['raster'].split(',')
+            self.maps[new] = self.maps.pop(old)
+            self.mtimes[new] = self.mtimes.pop(old)
+            self.descriptions[new] = self.descriptions.pop(old, None)
+
+    def raster_info(self, name, **kwargs):
+        return {'description': self.descriptions.get(name)}
+
+    def raster_mtime(self, name, **kwargs):
+        return self.mtimes.get(name)
+
+
+@pytest.fixture
+def mapset(monkeypatch):
+    mapset = NumpyMapset((6, 7))
+    monkeypatch.setattr(gs, 'mapcalc', mapset.mapcalc)
+    monkeypatch.setattr(gs, 'run_command', mapset.run_command)
+    monkeypatch.setattr(gs, 'raster_info', mapset.raster_info)
+    monkeypatch.setattr(prefix_sums, 'raster_mtime', mapset.raster_mtime)
+
+    rng = np.random.default_rng(5)
+    for year, month in month_range((2022, 6), (2024, 5)):
+        values = rng.random(mapset.shape) * 100
+        values[rng.random(mapset.shape) < 0.4] = np.nan
+        mapset._write(f"m_{year}_{month:02d}", values)
+    return mapset
+
+
+def _series_sum(mapset, start, end):
+    # r.series method=sum: nulls skipped, null where every month is null
+    stack = np.stack([mapset.maps[f"m_{y}_{m:02d}"] for y, m in month_range(start, end)])
+    return np.where(np.isnan(stack).all(axis=0), np.nan, np.nansum(stack, axis=0))
+
+
+@pytest.mark.parametrize("start, end", [
+    ((2022, 6), (2023, 5)),
+    ((2023, 6), (2024, 5)),
+    ((2023, 11), (2024, 3)),
+    ((2023, 4), (2023, 5)),
+])
+def test_window_sum_matches_series_sum(mapset, start, end):
+    build_prefix_sums("m", "s", (2022, 6), (2024, 5))
+    window_sum("s", start, end, "out", stack_start=(2022, 6))
+
+    np.testing.assert_allclose(mapset.maps["out"], _series_sum(mapset, start, end), equal_nan=True)
+
+
+def test_stack_rebuilt_from_new_origin(mapset):
+    build_prefix_sums("m", "s", (2022, 6), (2024, 5))
+    build_prefix_sums("m", "s", (2023, 6), (2024, 5))
+    window_sum("s", (2023, 6), (2024, 5), "out", stack_start=(2023, 6))
+
+    np.testing.assert_allclose(mapset.maps["out"], _series_sum(mapset, (2023, 6), (2024, 5)), equal_nan=True)
+
+
+def test_seasons_fall_inside_their_crop_year():
+    assert crop_year_window(2023, SEASONS['kharif']) == ((2023, 6), (2023, 10))
+    assert crop_year_window(2023, SEASONS['rabi']) == ((2023, 11), (2024, 3))
+    assert crop_year_window(2023, SEASONS['zaid']) == ((2024, 4), (2024, 5))
+
+
+def test_missing_month_stops_the_build(mapset):
+    del mapset.maps["m_2023_02"], mapset.mtimes["m_2023_02"]
+    with pytest.raises(RuntimeError, match="m_2023_02 not found"):
+        build_prefix_sums("m", "s", (2022, 6), (2024, 5))
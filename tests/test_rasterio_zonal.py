@@ -0,0 +1,36 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("rasterio")
+gpd = pytest.importorskip("geopandas")
+from rasterio.features import rasterize
+
+from rasterio_zonal import RasterioZoneGrid
+
+
+def _write_zones(path):
+    # Vertices off the cell lattice, so no cell centre lies on an edge
+    features = [
+        {"type": "Feature", "properties": {"name": name},
+         "geometry": {"type": "Polygon", "coordinates": [ring]}}
+        for name, ring in [
+            ("a", [[77.0, 20.0], [77.3137, 20.0213], [77.2071, 20.2729], [77.0, 20.0]]),
+            ("b", [[77.1513, 20.1007], [77.47, 20.1007], [77.47, 20.41], [77.1513, 20.41], [77.1513, 20.1007]]),
+            ("c", [[77.3911, 20.3303], [77.4307, 20.3303], [77.4307, 20.3697], [77.3911, 20.3697], [77.3911, 20.3303]]),
+        ]
+    ]
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    return str(path)
+
+
+def test_blockwise_labels_match_full_rasterize(tmp_path):
+    geojson_file = _write_zones(tmp_path / "zones.geojson")
+    zone_grid = RasterioZoneGrid(geojson_file, 0.002, block_rows=9)
+
+    zones = gpd.read_file(geojson_file)
+    expected = rasterize([(geom, cat) for cat, geom in enumerate(zones.geometry, start=1)],
+                         out_shape=zone_grid.shape, transform=zone_grid.transform, fill=0, dtype="int32")
+    np.testing.assert_array_equal(zone_grid.labels, expected)
+    assert isinstance(zone_grid.labels, np.memmap)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from zonal_engine import ZonalLayer, ZonalCrosstab, run_zonal_pass
+
+
+N_ZONES = 4
+
+
+def _blocks(rng, rows=60, cols=50, block_rows=16):
+    zones = rng.integers(0, N_ZONES + 1, (rows, cols)).astype(np.int32)
+    values = rng.gamma(2.0, 150.0, (rows, cols)).astype(np.float32)
+    values[rng.random((rows, cols)) < 0.1] = np.nan
+    classes = rng.integers(1, 9, (rows, cols)).astype(np.float32)
+    blocks = [
+        {"zones": zones[start:start + block_rows],
+         "eta": values[start:start + block_rows],
+         "lcc": classes[start:start + block_rows]}
+        for start in range(0, rows, block_rows)
+    ]
+    return blocks, zones, values, classes
+
+
+def _r_univar_percentile(values, percentile):
+    # r.univar: sorted values at rank int(n * p / 100 - 0.5)
+    v = np.sort(values)
+    rank = int(v.size * percentile / 100.0 - 0.5)
+    return v[min(max(rank, 0), v.size - 1)]
+
+
+def test_mean_cv_and_percentile_match_brute_force():
+    blocks, zones, values, _ = _blocks(np.random.default_rng(0))
+    layer = ZonalLayer("eta", "eta", ["number", "average", "coeff_var", "percentile"])
+    df = run_zonal_pass(blocks, [layer], N_ZONES)
+
+    for zone in range(1, N_ZONES + 1):
+        v = values[(zones == zone) & np.isfinite(values)].astype(np.float64)
+        row = df[df["cat"] == zone].iloc[0]
+        assert row["eta_number"] == v.size
+        assert row["eta_average"] == pytest.approx(v.mean(), rel=1e-9)
+        assert row["eta_coeff_var"] == pytest.approx(100 * v.std() / v.mean(), rel=1e-6)
+        assert row["eta_percentile_98"] == pytest.approx(_r_univar_percentile(v.astype(np.float32), 98))
+
+
+def test_histogram_percentile_within_error_bound():
+    blocks, zones, values, _ = _blocks(np.random.default_rng(1))
+    error = 0.05
+    exact = run_zonal_pass(blocks, [ZonalLayer("eta", "eta", ["percentile"])], N_ZONES)
+    approx = run_zonal_pass(blocks, [ZonalLayer("eta", "eta", ["percentile"], percentile_error=error)], N_ZONES)
+
+    difference = np.abs(approx["eta_percentile_98"] - exact["eta_percentile_98"])
+    assert (difference <= error + 1e-6).all()
+
+
+def test_masked_layer_only_counts_mask_classes():
+    blocks, zones, values, classes = _blocks(np.random.default_rng(2))
+    layer = ZonalLayer("eta_cropland", "eta", ["average"], mask_raster="lcc", mask_cats=(2, 3, 5))
+    df = run_zonal_pass(blocks, [layer], N_ZONES)
+
+    for zone in range(1, N_ZONES + 1):
+        keep = (zones == zone) & np.isfinite(values) & np.isin(classes, (2, 3, 5))
+        expected = values[keep].astype(np.float64).mean()
+        assert df.loc[df["cat"] == zone, "eta_cropland_average"].iloc[0] == pytest.approx(expected, rel=1e-9)
+
+
+def test_crosstab_counts_match_brute_force():
+    blocks, zones, _, classes = _blocks(np.random.default_rng(3))
+    crosstab = ZonalCrosstab("lcc", {2: "kharif", 3: "rabi", 7: "plantation"})
+    run_zonal_pass(blocks, [crosstab], N_ZONES)
+
+    assert list(crosstab.matrix.columns) == ["kharif", "rabi", "plantation"]
+    for zone in range(1, N_ZONES + 1):
+        for value, name in crosstab.classes.items():
+            assert crosstab.matrix.loc[zone, name] == np.sum((zones == zone) & (classes == value))